@@ -1,89 +1,143 @@
 from PyQt5.QtCore import QThread, pyqtSignal
-from loglib import MCLoc, IMU, Odometer, Battery, Controller, Send, Get, Laser, Manual, Speed2DSP
-from loglib import StopPoints, SlowDownPoints, SensorFuser, Fork
-from loglib import ErrorLine, WarningLine, ReadLog, FatalLine, NoticeLine, LaserOdometer, TaskStart, TaskFinish, Service
-from loglib import Memory
-from datetime import timedelta
+from loglib import ReadLog, TimeAxis, parser_table, parsers_bounds, parser_summary, merge_bounds, us2time
+from loglib import empty_copy, merge_parser, detach_file
+from logcache import ParseCache
+from logindex import get_index
+from logexpr import Channels, compile_expr
 from datetime import datetime
+from collections import OrderedDict
+import numpy as np
 import os
+import time
 
 def decide_old_imu(gx,gy,gz):
-    for v in gx:
-        if abs(round(v) - v) > 1e-5:
-            return True
-    for v in gy:
-        if abs(round(v) - v) > 1e-5:
-            return True
-    for v in gz:
-        if abs(round(v) - v) > 1e-5:
+    for v in (gx, gy, gz):
+        if np.any(np.abs(np.round(v) - v) > 1e-5):
             return True
     return False
 
+# data 中的键的前缀 -> 解析器的属性名
+PREFIXES = {"mcl": "mcl", "imu": "imu", "odo": "odo", "laserOdo": "laserOdo", "laser": "laser", "sensorfuser": "sensorfuser",
+            "stop": "stop", "slowdown": "slowdown", "send": "send", "manual": "manual", "get": "get", "dsp": "speedDsp",
+            "fork": "fork", "battery": "battery", "controller": "controller", "memory": "memory"}
+
+# 报警和任务等事件, 绘制竖线和生成报告时需要, 总是解析
+EVENTS = ("err", "war", "fatal", "notice", "taskstart", "taskfinish", "service")
+
+# 解析器属性名, 同一标签的解析器按此顺序尝试
+PARSER_ORDER = [name for name, _ in parser_table()]
+
+def with_index(bounds, index):
+    """ 用索引中文件的第一个和最后一个时间戳补全 (最早, 最晚) 时间(微秒) """
+    for t in (index.time_bounds() if index is not None else None) or ():
+        if t is not None:
+            bounds = merge_bounds(bounds, (t, t))
+    return bounds
+
 def Fdir2Flink(f):
     flink = " <a href='file:///" + f + "'>"+f+"</a>"
     return flink
 
+LOAD_CHUNK_SIZE = 16 * 1024 * 1024 # 打开文件时每个区间的字节数, 每解析完一个区间更新一次进度
+PARTIAL_INTERVAL = 2.0 # 解析过程中更新部分数据的间隔(秒)
+
 class ReadThread(QThread):
     signal = pyqtSignal('PyQt_PyObject')
+    keys_signal = pyqtSignal('PyQt_PyObject') # 解析前根据索引得到的有数据的键
+    loaded_signal = pyqtSignal('PyQt_PyObject') # load_keys 请求的通道解析完成
+    progress_signal = pyqtSignal('PyQt_PyObject') # 解析进度 {'id', 'done', 'total', 'lines', 'lines_per_sec', 'eta'}
+    partial_signal = pyqtSignal('PyQt_PyObject') # 解析过程中 data 更新为已解析的部分, 参数为读取的 id
+    polled_signal = pyqtSignal('PyQt_PyObject') # 跟踪模式下后台解析完新追加的内容, 参数为 (读取的 id, 新解析的行数)
 
     def __init__(self):
         QThread.__init__(self)
         self.filenames = []
+        self.workers = None # 解析log的进程数, None为cpu个数, 1为单进程
+        self.cache = ParseCache() # 解析结果的磁盘缓存, None为不使用缓存
+        self.follow = False # 跟踪模式, 读取后用 poll 解析文件新追加的内容
+        self.projection = True # 只解析 wanted 中的通道和事件, 其他通道用 load_keys 读取
+        self.wanted = [] # 打开文件时需要的键, 为空时取第一个有数据的键
+        self.pending = [] # 等待解析的解析器属性名
+        self.profile = False # 记录解析统计, 读取完成后将每个解析器的次数和时间加入 log. 此时不使用缓存, 时间为各进程之和
+        self.load_id = 0 # 每次取消读取加1, 界面用它忽略已取消的读取发出的信号
+        self.cancelled = False
+        self.reader = None # 正在解析的 ReadLog
+        self.polling = False # 跟踪模式下 start_poll 启动的线程只解析新追加的内容
+        self.follow_parts = None # 后台解析出的新数据 (解析器副本, 轮转的文件), 在界面线程中用 merge_follow 合并
         self.run()
 
     # run method gets called when we start the thread
     def run(self):
         """读取log"""
-        #初始化log数据
-        self.mcl = MCLoc()
-        self.imu = IMU()
-        self.odo = Odometer()
-        self.battery = Battery()
-        self.controller = Controller()
-        self.odo = Odometer()
-        self.laserOdo = LaserOdometer()
-        self.send = Send()
-        self.get = Get()
-        self.manual = Manual()
-        self.speedDsp = Speed2DSP()
-        self.fork = Fork()
-        self.stop = StopPoints()
-        self.slowdown = SlowDownPoints()
-        self.sensorfuser = SensorFuser()
-        self.laser = Laser(1000.0)
-        self.err = ErrorLine()
-        self.war = WarningLine()
-        self.fatal = FatalLine()
-        self.notice = NoticeLine()
-        self.taskstart = TaskStart()
-        self.taskfinish = TaskFinish()
-        self.service = Service()
-        self.memory = Memory()
-        self.tlist = []
+        self.cancelled = False
+        if self.polling:
+            self.polling = False
+            load_id = self.load_id
+            num = self.follow_poll()
+            self.polled_signal.emit((load_id, num))
+            return
+        if self.pending:
+            self.load_pending()
+            return
+        #初始化log数据, 与 logcache build 使用同样的解析器
+        for name, parser in parser_table():
+            setattr(self, name, parser)
+        self.tlist = TimeAxis() # 每毫秒一个时刻的时间轴, 界面用它的第一个和最后一个时刻设置横轴范围
+        self.files = [] # 每个文件的 (文件名, 最早时间, 最晚时间)
         self.log =  []
+        self.follow_log = None
+        self.follow_parts = None
+        self.old_imu_flag = False
+        self.indexes = dict()
+        self.loaded = set()
+        self.make_data()
         if self.filenames:
             log = ReadLog(self.filenames)
-            log.parse(self.mcl, self.imu, self.odo, self.battery, self.controller, self.laserOdo, self.stop, self.slowdown, self.sensorfuser,
-            self.send, self.get, self.manual, self.speedDsp, self.fork, self.laser,
-            self.err, self.war, self.fatal, self.notice, self.taskstart, self.taskfinish, self.service,
-            self.memory)
-            #analyze data
-            old_imu_flag = decide_old_imu(self.imu.gx()[0], self.imu.gy()[0], self.imu.gz()[0])
-            if old_imu_flag:
-                self.imu.old2newGyro()
-                print('The unit of gx, gy, gz in file is rad/s.')
-                self.log.append('The unit of gx, gy, gz in file is rad/s.') 
+            if self.profile:
+                log.profile()
+            self.reader = log
+            if self.follow:
+                # 跟踪的文件一直在增长, 不使用缓存和索引
+                self.loaded = set(PREFIXES.values())
+                log.follow(*self.parsers())
+                self.follow_log = log
             else:
-                print('The org unit of gx, gy, gz in IMU is LSB/s.')
-                self.log.append('The org unit of gx, gy, gz in IMU is LSB/s.')
-            tmax = max(self.mcl.t() + self.odo.t() + self.manual.t() + self.sensorfuser.t() + self.laser.t() + self.err.t() + self.fatal.t() + self.notice.t() + self.memory.t())
-            tmin = min(self.mcl.t() + self.odo.t() + self.manual.t() + self.sensorfuser.t() + self.laser.t() + self.err.t() + self.fatal.t() + self.notice.t() + self.memory.t())
-            dt = tmax - tmin
-            self.tlist = [tmin + timedelta(microseconds=x) for x in range(0, int(dt.total_seconds()*1e6+1000),1000)]
+                for f in self.filenames:
+                    if self.cancelled:
+                        return
+                    self.indexes[f] = get_index(f)
+                log.indexes = self.indexes
+                keys = self.index_keys(self.indexes.values())
+                self.keys_signal.emit(keys)
+                if self.projection:
+                    wanted = [r for k in self.wanted for r in self.data.refs(k)] or keys[:1]
+                    self.loaded = set(PREFIXES[k.split('.')[0]] for k in wanted)
+                else:
+                    self.loaded = set(PREFIXES.values())
+                log.progress = self.progress_callback(self.load_id)
+                log.parse_chunked(*self.parsers(self.loaded), workers = self.workers, chunk_size = LOAD_CHUNK_SIZE, cache = self.cache)
+                if self.cancelled:
+                    print('Loading cancelled')
+                    return
+            for f, info in log.encodings.items():
+                if info['encoding'] != 'utf-8' or info['fallbacks'] > 0:
+                    print('Encoding of', f, ':', info['encoding'], ',', info['fallbacks'], 'fallbacks')
+                    self.log.append('Encoding of' + Fdir2Flink(f) + ' : ' + info['encoding'] + ', ' + str(info['fallbacks']) + ' fallbacks')
+            self.log_profile(log)
+            #analyze data
+            if "imu" in self.loaded:
+                self.check_imu()
+            bounds = self.time_bounds()
+            if bounds is not None:
+                self.tlist = TimeAxis(*bounds)
+            self.files = self.file_bounds(log)
+            if len(self.files) > 1:
+                for f, start, end in self.files:
+                    print(f, ':', start, '~', end)
+                    self.log.append(Fdir2Flink(f) + ' : ' + str(start) + ' ~ ' + str(end))
             #save Error
             ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
             output_fname = "Report_" + str(ts).replace(':','-').replace(' ','_') + ".txt"
-            tmax = max(self.mcl.t() + self.odo.t() + self.manual.t() + self.sensorfuser.t() + self.laser.t() + self.err.t() + self.fatal.t() + self.notice.t() + self.memory.t())
             path = os.path.dirname(self.filenames[0])
             output_fname = path + "/" + output_fname
             self.log.append("Report File:" + Fdir2Flink(output_fname))
@@ -107,21 +161,191 @@ class ReadThread(QThread):
             for data in self.notice.content()[0]:
                 print(data, file = fid)
             fid.close()
+        self.make_data()
+        self.signal.emit(self.filenames)
+
+    def check_imu(self):
+        self.old_imu_flag = decide_old_imu(self.imu.gx()[0], self.imu.gy()[0], self.imu.gz()[0])
+        if self.old_imu_flag:
+            self.imu.old2newGyro()
+            print('The unit of gx, gy, gz in file is rad/s.')
+            self.log.append('The unit of gx, gy, gz in file is rad/s.') 
+        else:
+            print('The org unit of gx, gy, gz in IMU is LSB/s.')
+            self.log.append('The org unit of gx, gy, gz in IMU is LSB/s.')
+
+    def cancel(self):
+        """ 取消正在进行的读取, 在界面线程中调用, 之后用 wait() 等待线程结束
+        已取消的读取不再发出 signal, 之前发出的进度和部分数据的信号带有旧的 load_id
+        """
+        self.load_id += 1
+        self.cancelled = True
+        self.pending = []
+        if self.reader is not None:
+            self.reader.cancel()
+
+    def progress_callback(self, load_id):
+        """ 返回 ReadLog.progress 回调: 发出进度, 每隔 PARTIAL_INTERVAL 秒用已解析的部分更新 data 并发出 partial_signal """
+        start = time.time()
+        last = [start]
+        def progress(done, total, lines):
+            now = time.time()
+            dt = max(now - start, 1e-6)
+            eta = (total - done) * dt / done if done > 0 else None
+            self.progress_signal.emit({'id': load_id, 'done': done, 'total': total, 'lines': lines,
+                                       'lines_per_sec': lines / dt, 'eta': eta})
+            if done < total and now - last[0] >= PARTIAL_INTERVAL:
+                last[0] = now
+                self.make_data()
+                self.partial_signal.emit(load_id)
+        return progress
+
+    def log_profile(self, log):
+        """ 将 log 的解析统计加入 self.log """
+        if log.stats is not None:
+            for line in log.stats.report():
+                print(line)
+                self.log.append(line)
+
+    def parsers(self, names = None):
+        """ 解析器, names 为通道的解析器属性名, 为 None 时返回所有的解析器, 否则返回这些通道和事件的解析器
+        保持原来的顺序, 同一标签的解析器按顺序尝试
+        """
+        return [getattr(self, name) for name in PARSER_ORDER if names is None or name in names or name in EVENTS]
+
+    def load_keys(self, keys):
+        """ 解析 keys (通道名或表达式) 中还没有解析的通道, 在后台线程中进行, 完成后发出 loaded_signal
+        返回是否有需要解析的通道
+        """
+        names = [PREFIXES[r.split('.')[0]] for k in keys for r in self.data.refs(k)]
+        names = [n for n in names if n not in self.loaded]
+        if not names:
+            return False
+        for n in names:
+            if n not in self.pending:
+                self.pending.append(n)
+        if not self.isRunning():
+            self.start()
+        return True
+
+    def load_pending(self):
+        names = [n for n in self.pending if n not in self.loaded]
+        self.pending = []
+        self.log = []
+        if names and self.filenames:
+            print('Loading', names)
+            log = ReadLog(self.filenames)
+            log.indexes = self.indexes
+            if self.profile:
+                log.profile()
+            self.reader = log
+            # 只传入这些通道的解析器, 事件已经解析过
+            log.parse_chunked(*[getattr(self, n) for n in names], workers = self.workers, cache = self.cache)
+            if self.cancelled:
+                return
+            self.log_profile(log)
+            self.loaded.update(names)
+            if "imu" in names:
+                self.check_imu()
+            self.make_data()
+        self.loaded_signal.emit(names)
+
+    def parser(self, key):
+        """ data 的键对应的解析器 """
+        return getattr(self, PREFIXES[key.split('.')[0]])
+
+    def index_keys(self, indexes):
+        """ 根据索引中各标签的行数, 返回可能有数据的键 """
+        return [key for key in self.data if any(index.count(self.parser(key).tags) for index in indexes)]
+
+    def time_bounds(self):
+        """ 所有已解析的通道和事件的 (最早, 最晚) 时间(datetime), 没有数据时返回 None
+        各列在解析时记录了最小和最大值, 不需要遍历数据. 只解析了部分通道时, 用索引中每个文件的第一个和最后一个时间戳补全时间范围
+        """
+        bounds = parsers_bounds(self.parsers())
+        for index in self.indexes.values():
+            bounds = with_index(bounds, index)
+        if bounds is None:
+            return None
+        return tuple(t.astype(datetime) for t in us2time(bounds))
+
+    def file_bounds(self, log):
+        """ 每个文件的 (文件名, 最早时间, 最晚时间)(datetime64[us]), 合并 log 解析出的数据和索引中的时间戳 """
+        return [(f,) + us2time(with_index(log.bounds.get(f), self.indexes.get(f))) for f in log.filenames]
+
+    def summary(self):
+        """ 已解析的通道和事件的数据个数和时间范围, {解析器属性名: {'count', 'start', 'end'}} """
+        return OrderedDict((name, parser_summary(getattr(self, name))) for name in PARSER_ORDER
+                           if name in self.loaded or name in EVENTS)
+
+    def start_poll(self):
+        """ 跟踪模式下在后台线程中解析新追加的内容, 完成后发出 polled_signal, 之后在界面线程中调用 merge_follow
+        线程正在运行时返回 False
+        """
+        if self.follow_log is None or self.isRunning():
+            return False
+        self.polling = True
+        self.start()
+        return True
+
+    def follow_poll(self):
+        """ 解析新追加的内容到解析器的空副本中, 不修改界面正在使用的数据, 返回新解析的行数 """
+        log = self.follow_log
+        if log is None:
+            return 0
+        parts = [empty_copy(p) for p in self.parsers()]
+        num = log.follow(*parts)
+        rotated, log.rotated = log.rotated, []
+        self.follow_parts = (parts, rotated, num)
+        return num
+
+    def merge_follow(self):
+        """ 在界面线程中合并 follow_poll 解析出的数据并更新 data, 只是追加数组, 耗时很短 """
+        if self.follow_parts is None:
+            return
+        (parts, rotated, num), self.follow_parts = self.follow_parts, None
+        parsers = self.parsers()
+        for f in rotated:
+            for p in parsers:
+                detach_file(p, f)
+        if num == 0:
+            return
+        imu_num = len(self.imu.data[8])
+        for p, part in zip(parsers, parts):
+            merge_parser(p, part)
+        if self.old_imu_flag:
+            self.imu.old2newGyro(imu_num)
+        bounds = self.time_bounds()
+        if bounds is not None:
+            if not self.tlist:
+                self.tlist = TimeAxis(bounds[0])
+            self.tlist.extend_to(bounds[1])
+        self.make_data()
+
+    def poll(self):
+        """ 在当前线程中解析新追加的内容并合并, 返回新解析的行数 """
+        num = self.follow_poll()
+        self.merge_follow()
+        return num
+
+    def make_data(self):
         #creat dic
-        self.data = {"mcl.x":self.mcl.x(),"mcl.y":self.mcl.y(),"mcl.theta":self.mcl.theta(), "mcl.confidence":self.mcl.confidence(),
+        # 值为表达式的键在访问时才计算, 下拉框中也可以输入由通道组成的表达式
+        # laser.number 需要读取每一帧的激光点, 值为函数, 也在访问时才计算
+        self.data = Channels({"mcl.x":self.mcl.x(),"mcl.y":self.mcl.y(),"mcl.theta":self.mcl.theta(), "mcl.confidence":self.mcl.confidence(),
                      "mcl.cur_t":self.mcl.cur_t(), "mcl.ts":self.mcl.ts(),
                      "imu.yaw":self.imu.yaw(),"imu.pitch": self.imu.pitch(), "imu.roll": self.imu.roll(), "imu.ts":self.imu.ts(),
                      "imu.ax":self.imu.ax(),"imu.ay":self.imu.ay(),"imu.az":self.imu.az(),
                      "imu.gx":self.imu.gx(),"imu.gy":self.imu.gy(),"imu.gz":self.imu.gz(),
                      "imu.offx":self.imu.offx(),"imu.offy":self.imu.offy(),"imu.offz":self.imu.offz(),
-                     "imu.org_gx":([i+j for (i,j) in zip(self.imu.gx()[0],self.imu.offx()[0])], self.imu.gx()[1]),
-                     "imu.org_gy":([i+j for (i,j) in zip(self.imu.gy()[0],self.imu.offy()[0])], self.imu.gy()[1]),
-                     "imu.org_gz":([i+j for (i,j) in zip(self.imu.gz()[0],self.imu.offz()[0])], self.imu.gz()[1]),
+                     "imu.org_gx":compile_expr("imu.gx + imu.offx"),
+                     "imu.org_gy":compile_expr("imu.gy + imu.offy"),
+                     "imu.org_gz":compile_expr("imu.gz + imu.offz"),
                      "odo.ts": self.odo.ts(),"odo.x":self.odo.x(),"odo.y":self.odo.y(),"odo.theta":self.odo.theta(),"odo.stop":self.odo.stop(),
                      "odo.vx":self.odo.vx(),"odo.vy":self.odo.vy(),"odo.vw":self.odo.vw(),"odo.steer_angle":self.odo.steer_angle(),
                      "odo.encode0":self.odo.encode0(),"odo.encode1":self.odo.encode1(),"odo.encode2":self.odo.encode2(),"odo.encode3":self.odo.encode3(),
                      "laserOdo.ts":self.laserOdo.ts(),"laserOdo.x":self.laserOdo.x(),"laserOdo.y":self.laserOdo.y(),"laserOdo.angle":self.laserOdo.angle(),
-                     "laser.ts":self.laser.ts(), "laser.number":self.laser.number(),
+                     "laser.ts":self.laser.ts(), "laser.number":self.laser.number,
                      "sensorfuser.local":self.sensorfuser.localnum(),"sensorfuser.global":self.sensorfuser.globalnum(),
                      "stop.x":self.stop.x(),"stop.y":self.stop.y(),"stop.type":self.stop.type(), "stop.id":self.stop.id(), "stop.dist": self.stop.dist(),
                      "slowdown.x":self.slowdown.x(),"slowdown.y":self.slowdown.y(),"slowdown.type":self.slowdown.type(), "slowdown.id":self.slowdown.id(), "slowdown.dist": self.slowdown.dist(),
@@ -138,5 +362,4 @@ class ReadThread(QThread):
                      "controller.emc": self.controller.emc(),"controller.brake":self.controller.brake(),"controller.driveremc":self.controller.driveremc(),
                      "controller.manualcharge": self.controller.manualcharge(),"controller.autocharge": self.controller.autocharge(), "controller.electric": self.controller.electric(),
                      "memory.used_sys":self.memory.used_sys(), "memory.free_sys":self.memory.free_sys(), "memory.rbk_phy": self.memory.rbk_phy(),
-                     "memory.rbk_vir":self.memory.rbk_vir(),"memory.rbk_max_phy":self.memory.rbk_max_phy(),"memory.rbk_max_vir":self.memory.rbk_max_vir()}
-        self.signal.emit(self.filenames)
\ No newline at end of file
+                     "memory.rbk_vir":self.memory.rbk_vir(),"memory.rbk_max_phy":self.memory.rbk_max_phy(),"memory.rbk_max_vir":self.memory.rbk_max_vir()})
\ No newline at end of file
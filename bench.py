@@ -0,0 +1,202 @@
+""" loglib 解析速度测试
+用法: python bench.py [重复次数] [--baseline old_loglib.py]
+将 test1.log, test2.log 重复拼接成大文件, 统计 ReadLog.parse 每秒处理的行数,
+以及时间戳解码 rbktimetodate 与 strptime 的对比.
+--baseline 为原来版本的 loglib.py (如 git show <commit>:loglib.py > old_loglib.py), 用它的解析器作为对比
+      python bench.py --suite [--sizes 100M,1G,5G] [--json bench.json] [--compare old.json]
+用 loggen.py 生成各个大小的log, 统计每个解析器和 ReadThread 的全部解析器的 行/秒, MB/秒 和内存峰值,
+结果保存为 JSON, --compare 与之前保存的结果对比
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import importlib.util
+import multiprocessing
+from datetime import datetime
+from loglib import ReadLog, Laser, default_parsers
+from loglib import rbktimetodate, rbktimetous, RBK_TIME_FORMAT
+from loggen import LogGenerator, parse_size
+
+all_parsers = default_parsers
+THREAD_PARSERS = 'ReadThread'
+
+def load_baseline(path):
+    """ 导入原来版本的 loglib.py """
+    spec = importlib.util.spec_from_file_location('baseline_loglib', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def baseline_parsers(module):
+    """ 原来版本中与 default_parsers 同名的解析器 """
+    out = []
+    for p in default_parsers():
+        cls = getattr(module, type(p).__name__, None)
+        if cls is not None:
+            out.append(cls(1000.0) if isinstance(p, Laser) else cls())
+    return out
+
+def make_log(repeat, src = ("test1.log", "test2.log")):
+    """ 将 src 重复 repeat 次写入临时文件, 返回文件名 """
+    here = os.path.dirname(os.path.abspath(__file__))
+    raw = b"".join(open(os.path.join(here, f), 'rb').read() for f in src)
+    fd, fname = tempfile.mkstemp(suffix = ".log")
+    with os.fdopen(fd, 'wb') as f:
+        for _ in range(repeat):
+            f.write(raw)
+    return fname
+
+def count_lines(fname):
+    with open(fname, 'rb') as f:
+        return sum(1 for _ in f)
+
+def timeit(func, *args):
+    t0 = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - t0
+
+def bench_parse(fname, baseline = None):
+    """ 返回 (原版本行/秒, ReadLog.parse 行/秒), 没有 baseline 时原版本为 None """
+    lines = count_lines(fname)
+    t_new = timeit(ReadLog([fname]).parse, *all_parsers())
+    if baseline is None:
+        return None, lines / t_new
+    t_old = timeit(baseline.ReadLog([fname]).parse, *baseline_parsers(baseline))
+    return lines / t_old, lines / t_new
+
+def log_times(fname):
+    """ 取出文件中每一行的时间戳字符串 """
+    out = []
+    with open(fname, 'rb') as f:
+        for line in f:
+            if line.startswith(b'['):
+                out.append(line[1:27].decode('ascii', 'ignore'))
+    return out
+
+def bench_time(times):
+    """ 返回 strptime, rbktimetodate, rbktimetous 每秒解码的时间戳个数 """
+    def strptime_all():
+        for s in times:
+            datetime.strptime(s, RBK_TIME_FORMAT)
+    def todate_all():
+        for s in times:
+            rbktimetodate(s)
+    def tous_all():
+        for s in times:
+            rbktimetous(s)
+    return [len(times) / timeit(f) for f in (strptime_all, todate_all, tous_all)]
+
+def peak_rss():
+    """ 当前进程的内存峰值(MB), 不支持时(Windows)返回 None """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+def measure(fname, name):
+    """ 在子进程中运行: 用名为 name 的解析器(THREAD_PARSERS 为全部)解析 fname
+    返回 (秒数, 解析前的内存峰值MB, 解析后的内存峰值MB)
+    """
+    if name == THREAD_PARSERS:
+        parsers = default_parsers()
+    else:
+        parsers = [p for p in default_parsers() if type(p).__name__ == name]
+    log = ReadLog([fname])
+    log.skipped = []
+    base = peak_rss()
+    t = timeit(log.parse, *parsers)
+    return t, base, peak_rss()
+
+def measure_isolated(fname, name):
+    """ 每次测量用一个新的进程, 内存峰值互不影响 """
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(measure, (fname, name))
+
+def suite_log(folder, size, seed):
+    """ 生成(或复用之前 --keep 保留的)大小为 size 的log, 返回 (文件名, 是否为新生成的) """
+    fname = os.path.join(folder, 'bench_{0}_{1}.log'.format(size, seed))
+    if os.path.isfile(fname) and os.path.getsize(fname) >= size:
+        return fname, False
+    print("Generating", fname)
+    os.makedirs(folder, exist_ok = True)
+    LogGenerator(seed).write(fname, size)
+    return fname, True
+
+def run_suite(sizes, names, folder, seed, keep):
+    """ 返回结果列表, 每个 (大小, 解析器) 一项 """
+    results = []
+    for text in sizes:
+        size = parse_size(text)
+        fname, generated = suite_log(folder, size, seed)
+        try:
+            lines = count_lines(fname)
+            mb = os.path.getsize(fname) / 1024 / 1024
+            print("File:", fname, "{0:.0f} MB".format(mb), lines, "lines")
+            for name in names:
+                seconds, base, peak = measure_isolated(fname, name)
+                results.append({'size': text, 'bytes': os.path.getsize(fname), 'lines': lines, 'parser': name,
+                                'seconds': seconds, 'lines_per_s': lines / seconds, 'mb_per_s': mb / seconds,
+                                'base_rss_mb': base, 'peak_rss_mb': peak})
+                print("  {0:16s} {1:12.0f} lines/s {2:8.1f} MB/s  peak {3} MB".format(
+                    name, lines / seconds, mb / seconds, "-" if peak is None else "{0:.0f}".format(peak)))
+        finally:
+            if generated and not keep:
+                os.remove(fname)
+    return results
+
+def compare(results, old):
+    """ 打印与之前结果的 行/秒 之比 """
+    before = dict(((r['size'], r['parser']), r) for r in old['results'])
+    for r in results:
+        o = before.get((r['size'], r['parser']))
+        if o:
+            print("  {0:6s} {1:16s} {2:6.2f}x".format(r['size'], r['parser'], r['lines_per_s'] / o['lines_per_s']))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "loglib parse benchmark")
+    parser.add_argument('repeat', nargs = '?', type = int, default = 200, help = "times to repeat test1.log and test2.log")
+    parser.add_argument('--baseline', default = None, help = "loglib.py of an older version to compare with")
+    parser.add_argument('--suite', action = 'store_true', help = "run the benchmark suite on generated logs")
+    parser.add_argument('--sizes', default = '100M,1G,5G')
+    parser.add_argument('--parsers', default = None, help = "comma separated parser class names, default all and " + THREAD_PARSERS)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--dir', default = None, help = "directory of the generated logs, default the temp directory")
+    parser.add_argument('--keep', action = 'store_true', help = "keep the generated logs for the next run")
+    parser.add_argument('--json', default = None, help = "save the results to this file")
+    parser.add_argument('--compare', default = None, help = "results saved by a previous run")
+    args = parser.parse_args()
+    if args.suite:
+        names = args.parsers.split(',') if args.parsers else [type(p).__name__ for p in default_parsers()] + [THREAD_PARSERS]
+        results = run_suite(args.sizes.split(','), names, args.dir or tempfile.gettempdir(), args.seed, args.keep)
+        if args.json:
+            meta = {'date': datetime.now().isoformat(), 'python': sys.version.split()[0], 'platform': platform.platform(),
+                    'machine': platform.machine(), 'cpus': os.cpu_count(), 'seed': args.seed}
+            with open(args.json, 'w') as f:
+                json.dump({'meta': meta, 'results': results}, f, indent = 1)
+            print("Saved", args.json)
+        if args.compare:
+            with open(args.compare) as f:
+                print("Compared with", args.compare)
+                compare(results, json.load(f))
+    else:
+        fname = make_log(args.repeat)
+        try:
+            print("File: ", fname, os.path.getsize(fname) // 1024, "KB ", count_lines(fname), "lines")
+            old, new = bench_parse(fname, load_baseline(args.baseline) if args.baseline else None)
+            if old is None:
+                print("ReadLog.parse: {0:12.0f} lines/s".format(new))
+            else:
+                print("baseline:      {0:12.0f} lines/s".format(old))
+                print("ReadLog.parse: {0:12.0f} lines/s ({1:.2f}x)".format(new, new / old))
+            strp, todate, tous = bench_time(log_times(fname))
+            print("strptime:      {0:12.0f} stamps/s".format(strp))
+            print("rbktimetodate: {0:12.0f} stamps/s ({1:.2f}x)".format(todate, todate / strp))
+            print("rbktimetous:   {0:12.0f} stamps/s ({1:.2f}x)".format(tous, tous / strp))
+        finally:
+            os.remove(fname)
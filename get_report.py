@@ -10,8 +10,11 @@ init()
 filenames = []
 ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 output_fname = "Report_" + str(ts).replace(':','-').replace(' ','_') + ".txt"
-if len(sys.argv) > 1:
-    filenames = sys.argv[1:]
+# --profile: 打印每个解析器的尝试, 匹配次数, 时间和未匹配的标签
+profile = '--profile' in sys.argv
+argv = [a for a in sys.argv[1:] if a != '--profile']
+if len(argv) > 0:
+    filenames = argv
     if len(filenames) == 1 and isdir(filenames[0]):
         mypath = filenames[0]
         tmp_files = [join(mypath,f) for f in listdir(mypath) if isfile(join(mypath, f))]
@@ -35,6 +38,8 @@ for filename in filenames:
     war = WarningLine()
     fat = FatalLine()
     notice = NoticeLine()
+    if profile:
+        log.profile()
     log.parse(err, war, fat, notice)
     print("="*20)
     if len(err.content()[0]) >= 1 or len(fat.content()[0]) >= 1 :
@@ -44,22 +49,26 @@ for filename in filenames:
     else:
         print("Files: ", filename)
     print( len(fat.content()[0]), " FATALs, ", len(err.content()[0]), " ERRORs, ", len(war.content()[0]), " WARNINGs, ", len(notice.content()[0]), " NOTICEs")
-    if len(fat.alarmnum()[0]) >= 1:
+    if len(fat.alarms()) >= 1:
         print("FATAL:")
-        for iter in range(0, len(fat.alarmnum()[0])):
-            print(' '*2, fat.alarmnum()[0][iter]," ",fat.alarminfo()[0][iter])
-    if len(err.alarmnum()[0]) >= 1:
+        for num, alarm in fat.alarms().items():
+            print(' '*2, num, " ", alarm.info, " x", alarm.count)
+    if len(err.alarms()) >= 1:
         print("ERRORS:")
-        for iter in range(0, len(err.alarmnum()[0])):
-            print(' '*2,err.alarmnum()[0][iter]," ",err.alarminfo()[0][iter])
-    if len(war.alarmnum()[0]) >= 1:
+        for num, alarm in err.alarms().items():
+            print(' '*2, num, " ", alarm.info, " x", alarm.count)
+    if len(war.alarms()) >= 1:
         print("WARNING:")
-        for iter in range(0, len(war.alarmnum()[0])):
-            print(' '*2,war.alarmnum()[0][iter]," ",war.alarminfo()[0][iter])
-    if len(notice.alarmnum()[0]) >= 1:
+        for num, alarm in war.alarms().items():
+            print(' '*2, num, " ", alarm.info, " x", alarm.count)
+    if len(notice.alarms()) >= 1:
         print("NOTICE:")
-        for iter in range(0, len(notice.alarmnum()[0])):
-            print(' '*2,notice.alarmnum()[0][iter]," ",notice.alarminfo()[0][iter])
+        for num, alarm in notice.alarms().items():
+            print(' '*2, num, " ", alarm.info, " x", alarm.count)
+    if profile:
+        print("PROFILE:")
+        for line in log.stats.report():
+            print(' '*2, line)
 
 
     print("="*20, file = fid)
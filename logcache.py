@@ -0,0 +1,208 @@
+""" log解析结果的磁盘缓存
+每个log文件的解析结果按 (绝对路径, 大小, 修改时间, SCHEMA_VERSION) 存为一个缓存目录,
+再次打开同一个文件时直接读取, 不需要重新解析.
+Column 存为 .npy 文件, 读取时用 mmap 映射, 其余数据用 pickle 保存.
+用法: python logcache.py build DIR   预先解析 DIR 下的所有 .log 文件
+      python logcache.py info        显示缓存目录和大小
+      python logcache.py clear       清空缓存
+"""
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import argparse
+import numpy as np
+from loglib import Column, ReadLog, SCHEMA_VERSION, empty_copy, default_parsers
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+def default_root():
+    """ 缓存目录, 可以用环境变量 LOGREADER_CACHE_DIR 指定 """
+    root = os.environ.get('LOGREADER_CACHE_DIR')
+    if root:
+        return root
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'LogReader')
+
+def file_key(filename):
+    """ 文件的缓存键, 文件被修改后键随之改变 """
+    st = os.stat(filename)
+    raw = '{0}|{1}|{2}|{3}'.format(os.path.abspath(filename), st.st_size, st.st_mtime_ns, SCHEMA_VERSION)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def parser_key(parser):
+    """ 解析器的缓存键: 类名 + 简单的配置参数(例如 Laser 的 max_dist) """
+    config = sorted((k, v) for k, v in vars(parser).items()
+                    if k not in ('data', 'time') and isinstance(v, (bool, int, float, str)))
+    raw = type(parser).__name__ + repr(config)
+    return type(parser).__name__ + '_' + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:8]
+
+class _ColumnPickler(pickle.Pickler):
+    """ 将 Column 单独存为 .npy 文件 """
+    def __init__(self, f, folder):
+        pickle.Pickler.__init__(self, f, pickle.HIGHEST_PROTOCOL)
+        self.folder = folder
+        self.num = 0
+    def persistent_id(self, obj):
+        if not isinstance(obj, Column):
+            return None
+        values = obj.array()
+        if obj.view:
+            values = values.view(np.int64)
+        name = 'c{0}.npy'.format(self.num)
+        self.num += 1
+        np.save(os.path.join(self.folder, name), values)
+        return (name, obj.typecode, obj.view, len(values), obj.limits)
+
+class _ColumnUnpickler(pickle.Unpickler):
+    """ 用mmap读取 .npy 文件, 还原 Column """
+    def __init__(self, f, folder):
+        pickle.Unpickler.__init__(self, f)
+        self.folder = folder
+    def persistent_load(self, pid):
+        name, typecode, view, size, limits = pid
+        col = Column(typecode, view)
+        if size > 0:
+            col.head = np.load(os.path.join(self.folder, name), mmap_mode = 'r')
+            col.limits = limits
+        return col
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+class ParseCache:
+    """ 解析结果的磁盘缓存, 供 ReadLog.parse_parallel/parse_chunked 的 cache 参数使用
+    root: 缓存目录, 默认为 default_root()
+    max_bytes: 缓存的总大小, 超过后删除最久没有使用的文件
+    """
+    def __init__(self, root = None, max_bytes = DEFAULT_MAX_BYTES):
+        self.root = root or default_root()
+        self.max_bytes = max_bytes
+    def entry(self, filename):
+        return os.path.join(self.root, file_key(filename))
+    def load(self, filename, parsers):
+        """ 读取 filename 的缓存, 返回 (解析器列表, 行数, 编码信息, 跳过的行)
+        parsers 中任何一个解析器没有缓存时返回 None
+        """
+        try:
+            folder = self.entry(filename)
+            meta_file = os.path.join(folder, 'meta.json')
+            with open(meta_file, encoding = 'utf-8') as f:
+                meta = json.load(f)
+            out = []
+            for p in parsers:
+                sub = os.path.join(folder, parser_key(p))
+                with open(os.path.join(sub, 'state.pkl'), 'rb') as f:
+                    state = _ColumnUnpickler(f, sub).load()
+                q = empty_copy(p)
+                for name, value in state.items():
+                    setattr(q, name, value)
+                out.append(q)
+            with open(os.path.join(folder, 'skipped.pkl'), 'rb') as f:
+                skipped = pickle.load(f)
+            os.utime(meta_file)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+        return out, meta['lines'], meta['encoding'], skipped
+    def save(self, filename, parsers, lines, encoding, skipped = ()):
+        """ 保存 filename 的解析结果, 已有缓存的解析器不会重复保存 """
+        try:
+            folder = self.entry(filename)
+            os.makedirs(folder, exist_ok = True)
+            for p in parsers:
+                sub = os.path.join(folder, parser_key(p))
+                if os.path.isdir(sub):
+                    continue
+                tmp = sub + '.tmp{0}'.format(os.getpid())
+                os.makedirs(tmp, exist_ok = True)
+                state = dict((name, getattr(p, name)) for name in ('data', 'time') if hasattr(p, name))
+                with open(os.path.join(tmp, 'state.pkl'), 'wb') as f:
+                    _ColumnPickler(f, tmp).dump(state)
+                try:
+                    os.rename(tmp, sub)
+                except OSError:
+                    shutil.rmtree(tmp, ignore_errors = True)
+            with open(os.path.join(folder, 'skipped.pkl'), 'wb') as f:
+                pickle.dump(list(skipped), f)
+            meta = {'filename': os.path.abspath(filename), 'lines': lines, 'encoding': encoding}
+            with open(os.path.join(folder, 'meta.json'), 'w', encoding = 'utf-8') as f:
+                json.dump(meta, f)
+        except OSError as e:
+            print("Failed to write cache for", filename, e)
+            return
+        self.evict()
+    def entries(self):
+        """ 返回 [(最近使用时间, 大小, 目录)] """
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for name in os.listdir(self.root):
+            if name == 'index':
+                # logindex 的索引很小, 每个log文件只有一个, 不参与淘汰
+                continue
+            folder = os.path.join(self.root, name)
+            try:
+                used = os.path.getmtime(os.path.join(folder, 'meta.json'))
+            except OSError:
+                used = 0
+            out.append((used, _dir_size(folder), folder))
+        return out
+    def evict(self):
+        """ 缓存超过 max_bytes 时删除最久没有使用的文件 """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, folder in entries:
+            if total <= self.max_bytes:
+                break
+            # Windows下正在被mmap的文件无法删除, 留到下次
+            shutil.rmtree(folder, ignore_errors = True)
+            total -= size
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors = True)
+
+def log_files(dirs):
+    out = []
+    for d in dirs:
+        if os.path.isfile(d):
+            out.append(d)
+            continue
+        for root, _, files in os.walk(d):
+            out.extend(os.path.join(root, f) for f in sorted(files) if f.endswith('.log'))
+    return out
+
+def build(files, cache, workers = None):
+    """ 预先解析 files 并写入缓存. 每次只解析一个文件, 解析后丢弃结果, 内存只与最大的文件有关 """
+    for f in files:
+        ReadLog([f]).parse_chunked(*default_parsers(), workers = workers, cache = cache)
+        print("Cached", f)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "LogReader parse cache")
+    parser.add_argument('command', choices = ['build', 'info', 'clear'])
+    parser.add_argument('dirs', nargs = '*', help = "log files or directories for build")
+    parser.add_argument('--root', default = None, help = "cache directory")
+    parser.add_argument('--workers', type = int, default = None)
+    args = parser.parse_args()
+    cache = ParseCache(args.root)
+    if args.command == 'build':
+        files = log_files(args.dirs)
+        build(files, cache, args.workers)
+        print("Cached", len(files), "files in", cache.root)
+    elif args.command == 'info':
+        entries = cache.entries()
+        print("Cache dir:", cache.root)
+        print("Files:", len(entries), " Size: {0:.1f} MB".format(sum(e[1] for e in entries) / 1024 / 1024))
+    elif args.command == 'clear':
+        cache.clear()
+        print("Cleared", cache.root)
@@ -0,0 +1,200 @@
+""" 通道表达式
+在下拉框中输入由通道组成的表达式, 例如
+    mcl.x - odo.x
+    hypot(odo.vx, odo.vy)
+    deg(imu.yaw) - mcl.theta
+    diff(odo.x) / diff(t)
+表达式用 ast 检查后编译, 用 numpy 整列计算. 以第一个通道的时间为基准, 其他通道线性插值到这些时间上.
+t 为基准时间(秒), 只允许 FUNCTIONS 中的函数和 CONSTANTS 中的常数
+"""
+import ast
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
+import numpy as np
+from loglib import TimeSeries, time64
+
+EXPR_CACHE_SIZE = 128 # 编译后的表达式的缓存个数
+RESULT_CACHE_SIZE = 32 # 每个 Channels 缓存的计算结果个数
+
+class ExprError(ValueError):
+    """ 表达式无效或者无法计算 """
+
+def diff(x):
+    """ 相邻两点的差, 长度不变, 第一个点为 nan """
+    x = np.atleast_1d(np.asarray(x, dtype = np.float64))
+    out = np.empty_like(x)
+    out[:1] = np.nan
+    np.subtract(x[1:], x[:-1], out = out[1:])
+    return out
+
+FUNCTIONS = {'abs': np.abs, 'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log, 'log10': np.log10,
+             'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'asin': np.arcsin, 'acos': np.arccos, 'atan': np.arctan,
+             'atan2': np.arctan2, 'hypot': np.hypot, 'deg': np.degrees, 'rad': np.radians,
+             'floor': np.floor, 'round': np.round, 'min': np.fmin, 'max': np.fmax,
+             'diff': diff, 'cumsum': np.cumsum}
+# 函数的参数个数, 不在其中的为1个. numpy 函数多出的位置参数是输出数组, 会改写通道的数据, 因此需要检查
+ARITY = {'atan2': 2, 'hypot': 2, 'min': 2, 'max': 2}
+CONSTANTS = {'pi': np.pi, 'e': np.e}
+_GLOBALS = dict(FUNCTIONS, __builtins__ = {})
+_GLOBALS.update(CONSTANTS)
+_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_UNARYOPS = (ast.UAdd, ast.USub)
+
+class _Compiler(ast.NodeTransformer):
+    """ 检查表达式的语法, 将通道 a.b 替换为变量 _c0, _c1, ... """
+    def __init__(self):
+        self.channels = []
+    def generic_visit(self, node):
+        raise ExprError("unsupported syntax: " + type(node).__name__)
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _BINOPS):
+            raise ExprError("unsupported operator: " + type(node.op).__name__)
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return node
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _UNARYOPS):
+            raise ExprError("unsupported operator: " + type(node.op).__name__)
+        node.operand = self.visit(node.operand)
+        return node
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ExprError("unsupported constant: " + repr(node.value))
+        return node
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ExprError("unknown function: " + ast.dump(node.func))
+        if node.keywords:
+            raise ExprError("keyword arguments are not supported")
+        n = ARITY.get(node.func.id, 1)
+        if len(node.args) != n:
+            raise ExprError("{0}() takes {1} argument(s)".format(node.func.id, n))
+        node.args = [self.visit(a) for a in node.args]
+        return node
+    def visit_Name(self, node):
+        if node.id == 't' or node.id in CONSTANTS:
+            return node
+        raise ExprError("unknown name: " + node.id)
+    def visit_Attribute(self, node):
+        if not isinstance(node.value, ast.Name):
+            raise ExprError("unsupported syntax: " + ast.dump(node))
+        key = node.value.id + '.' + node.attr
+        if key not in self.channels:
+            self.channels.append(key)
+        return ast.copy_location(ast.Name(id = '_c{0}'.format(self.channels.index(key)), ctx = ast.Load()), node)
+
+def align(series, times):
+    """ 将 series 线性插值到 times 上, 时间相同时直接返回数值 """
+    if len(series.times) == len(times) and (series.times is times or np.array_equal(series.times, times)):
+        return np.asarray(series.values, dtype = np.float64)
+    return series.resample(times).values
+
+class Expression:
+    """ 编译后的表达式
+    text: 表达式; channels: 用到的通道名, 按出现的顺序; code: 编译后的代码
+    """
+    def __init__(self, text):
+        self.text = text
+        try:
+            tree = ast.parse(text.strip(), mode = 'eval')
+        except SyntaxError as e:
+            raise ExprError("invalid expression: " + text) from e
+        compiler = _Compiler()
+        tree = ast.fix_missing_locations(compiler.visit(tree))
+        if not compiler.channels:
+            raise ExprError("expression uses no channel: " + text)
+        self.channels = compiler.channels
+        self.code = compile(tree, '<expr>', 'eval')
+    def evaluate(self, data, t1 = None, t2 = None):
+        """ 计算 [t1, t2] 内的结果, 返回 TimeSeries. data 为通道名 -> TimeSeries 的字典或 Channels """
+        for k in self.channels:
+            if k not in data:
+                raise ExprError("unknown channel: " + k)
+        series = [data[k] for k in self.channels]
+        series[0] = series[0].between(t1, t2)
+        times = series[0].times
+        names = {'t': times.view(np.int64) / 1e6}
+        try:
+            for k, s in enumerate(series):
+                if len(s.values) != len(s.times):
+                    raise ExprError("{0}: {1} values for {2} times".format(self.channels[k], len(s.values), len(s.times)))
+                names['_c{0}'.format(k)] = align(s, times)
+            with np.errstate(all = 'ignore'):
+                out = np.asarray(eval(self.code, _GLOBALS, names), dtype = np.float64)
+            if out.shape != times.shape:
+                out = np.broadcast_to(out, times.shape).copy()
+        except (TypeError, ValueError) as e:
+            raise ExprError(self.text + ": " + str(e)) from e
+        return TimeSeries(out, times)
+
+@lru_cache(maxsize = EXPR_CACHE_SIZE)
+def compile_expr(text):
+    """ 编译表达式, 相同的表达式只编译一次 """
+    return Expression(text)
+
+class Channels(Mapping):
+    """ 通道名 -> TimeSeries
+    channels 中值为 Expression 的键(如 imu.org_gx)在访问时才计算, 值为函数的键(如 laser.number)在访问时才调用;
+    不是通道名的键按表达式计算, 如 data["mcl.x - odo.x"].
+    表达式的结果按 (表达式, 时间窗口) 缓存, 数据更新时创建新的 Channels
+    """
+    def __init__(self, channels):
+        self.channels = channels
+        self.results = OrderedDict()
+    def __getitem__(self, key):
+        try:
+            return self.evaluate(key)
+        except ExprError:
+            raise KeyError(key)
+    def __iter__(self):
+        return iter(self.channels)
+    def __len__(self):
+        return len(self.channels)
+    def __contains__(self, key):
+        """ key 为通道名, 或者只用到已有通道的表达式, 不计算表达式 """
+        if key in self.channels:
+            return True
+        try:
+            expr = compile_expr(key)
+        except ExprError:
+            return False
+        return all(k in self.channels for k in expr.channels)
+    def refs(self, key):
+        """ key (通道名或表达式) 用到的原始通道名, 无效的表达式返回空列表 """
+        value = self.channels.get(key)
+        if value is not None and not isinstance(value, Expression):
+            return [key]
+        try:
+            expr = value if value is not None else compile_expr(key)
+        except ExprError:
+            return []
+        out = []
+        for k in expr.channels:
+            if k in self.channels:
+                out.extend(r for r in self.refs(k) if r not in out)
+        return out
+    def evaluate(self, key, t1 = None, t2 = None):
+        """ 通道名或表达式 key 在 [t1, t2] 内的数据, None 表示不限, 无效时抛出 ExprError """
+        value = self.channels.get(key)
+        if isinstance(value, TimeSeries):
+            if t1 is None and t2 is None:
+                return value
+            return value.between(t1, t2)
+        window = (key, None if t1 is None else time64(t1), None if t2 is None else time64(t2))
+        out = self.results.get(window)
+        if out is not None:
+            self.results.move_to_end(window)
+            return out
+        if value is None or isinstance(value, Expression):
+            expr = value if value is not None else compile_expr(key)
+            out = expr.evaluate(self, window[1], window[2])
+        else:
+            out = value().between(window[1], window[2])
+        self.results[window] = out
+        if len(self.results) > RESULT_CACHE_SIZE:
+            self.results.popitem(last = False)
+        return out
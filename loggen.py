@@ -0,0 +1,229 @@
+""" 生成rbk格式的测试log
+同样的参数(包括 seed)生成的文件完全相同, 用于在不同规模下测试解析速度(bench.py --suite)
+用法: python loggen.py out.log --size 100M
+      python loggen.py out.log --size 1G --seed 1 --imu-fields 13 --odo-fields 14 --laser-points 361 --rate Laser=30
+包含的内容:
+    IMU 11/13个字段, Odometer 10~14个字段, 有N个点的激光, 定位, 速度, 控制器, 电池等数据
+    Alarm(报警内容为 gbk 编码的中文), 内存, 任务开始/结束, 服务信息, 不解析的 DI/DO 行
+    格式不对的行: 被截断的行, 没有时间戳的行, 无法解码的行, 字段个数不对的行
+"""
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# 每秒的行数
+DEFAULT_RATES = (('IMU', 100), ('Odometer', 50), ('Location', 10), ('Laser', 15), ('Send', 20), ('Get', 20),
+                 ('Controller', 10), ('Battery', 1), ('Speed2DSP', 20), ('Manual', 2), ('Fork', 5),
+                 ('StopPoints', 2), ('SlowDownPoints', 2), ('SensorFuserPoints', 5), ('LaserOdometer', 10),
+                 ('Memory', 0.2), ('Task', 0.05), ('Service', 0.1), ('Alarm', 0.2), ('DI', 10), ('DO', 10),
+                 ('Bad', 0.05))
+DEFAULT_START = datetime(2018, 12, 24, 14, 55, 49)
+ALARMS = (('error', 'Error', '52600', '精度误差过大(xy)：{0:.6f}'),
+          ('error', 'Error', '52101', '激光数据超时：{0:.0f} ms'),
+          ('warning', 'Warning', '54004', '电池电量低：{0:.1f}%'),
+          ('warning', 'Warning', '54211', '定位置信度低：{0:.3f}'),
+          ('fatal', 'Fatal', '50100', '急停被按下：{0:.0f}'),
+          ('info', 'Notice', '57003', '充电中：{0:.1f}'))
+MEMORY = (('Used system memory', 'GB'), ('Free system memory', 'GB'),
+          ('Robokit physical memory usage', 'MB'), ('Robokit virtual memory usage', 'MB'),
+          ('Robokit Max physical memory usage', 'MB'), ('Robokit Max virtual memory usage', 'MB'))
+_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+def parse_size(text):
+    """ "100M", "1G", "512K" 或字节数 """
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in _UNITS:
+        return int(float(text[:-1]) * _UNITS[text[-1]])
+    return int(text)
+
+class LogGenerator:
+    """ 按固定的随机种子生成log行, 时间递增, 标签按 rates 中的比例随机出现
+    rates: [(标签, 每秒行数)], 默认为 DEFAULT_RATES, 行数为0的标签不出现
+    imu_fields: IMU 的字段个数, 11 或 13
+    odo_fields: Odometer 的字段个数, 10~14
+    laser_points: 每帧激光的点数
+    encoding: 报警等文本的编码
+    """
+    def __init__(self, seed = 0, rates = DEFAULT_RATES, imu_fields = 11, odo_fields = 10, laser_points = 181,
+                 encoding = 'gbk', start = DEFAULT_START):
+        if imu_fields not in (11, 13):
+            raise ValueError("imu_fields must be 11 or 13")
+        if not 10 <= odo_fields <= 14:
+            raise ValueError("odo_fields must be in [10, 14]")
+        self.rng = random.Random(seed)
+        self.rates = [(tag, rate) for tag, rate in rates if rate > 0]
+        self.imu_fields = imu_fields
+        self.odo_fields = odo_fields
+        self.laser_points = laser_points
+        self.encoding = encoding
+        self.start = start
+        self.start_us = (start - datetime(1970, 1, 1)) // timedelta(microseconds = 1)
+        self.step = 180.0 / max(laser_points - 1, 1)
+        self.angles = ['{0:g}'.format(-90 + i * self.step) for i in range(laser_points)]
+        self.x, self.y, self.theta = 0.0, 0.0, 0.0
+        self.task = 0
+        self.second = None
+        self.prefix = ''
+    def stamp(self, us):
+        """ 微秒数转化为rbk的时间戳, 缓存秒的部分 """
+        second = us // 1000000
+        if second != self.second:
+            self.second = second
+            self.prefix = (self.start + timedelta(seconds = second)).strftime('%Y-%m-%d %H:%M:%S')
+        return '{0}.{1:06d}'.format(self.prefix, us % 1000000)
+    def lines(self):
+        """ 无限生成log行(bytes), 行间隔按总频率取平均 """
+        tags = [tag for tag, _ in self.rates]
+        weights = [rate for _, rate in self.rates]
+        total = sum(weights)
+        if total <= 0:
+            return
+        dt = 1e6 / total
+        us = 0.0
+        rng = self.rng
+        while True:
+            for tag in rng.choices(tags, weights, k = 1024):
+                us += dt * (0.5 + rng.random())
+                t = int(us)
+                yield getattr(self, 'line_' + tag)(self.stamp(t), t)
+    def write(self, filename, size):
+        """ 生成至少 size 字节写入 filename, 返回 (字节数, 行数) """
+        written, num = 0, 0
+        block = []
+        with open(filename, 'wb') as f:
+            for line in self.lines():
+                block.append(line)
+                written += len(line)
+                num += 1
+                if len(block) >= 4096 or written >= size:
+                    f.write(b''.join(block))
+                    block = []
+                if written >= size:
+                    break
+        return written, num
+
+    def debug(self, stamp, tag, values):
+        return '[{0}][debug] [{1}][{2}]\n'.format(stamp, tag, '|'.join(values)).encode('ascii')
+    def floats(self, n, scale = 1.0):
+        rng = self.rng
+        return ['{0:.6f}'.format((rng.random() - 0.5) * scale) for _ in range(n)]
+    def ns(self, t):
+        """ 数据中的纳秒时间戳 """
+        return str((self.start_us + t) * 1000 + self.rng.randrange(1000))
+
+    def line_IMU(self, stamp, t):
+        angles = self.floats(1 if self.imu_fields == 11 else 3, 6.28)
+        acc = self.floats(3, 0.5)
+        acc[2] = '{0:.6f}'.format(9.6 + self.rng.random() * 0.05)
+        # 字段顺序与 loglib.IMU 一致: 角度, 时间戳, 加速度, 角速度, 零偏
+        values = angles + [self.ns(t)] + acc + self.floats(3, 0.01) + ['-29', '-6', '-1']
+        return self.debug(stamp, 'IMU', values)
+    def line_Odometer(self, stamp, t):
+        rng = self.rng
+        self.x += rng.random() * 0.001
+        self.y += rng.random() * 0.001
+        self.theta = (self.theta + rng.random() * 0.01) % 6.28
+        values = ['0', self.ns(t), '{0:.6f}'.format(self.x), '{0:.6f}'.format(self.y), '{0:.6f}'.format(self.theta),
+                  'false' if rng.random() < 0.9 else 'true'] + self.floats(4, 1.0)
+        values += [str(rng.randrange(100000)) for _ in range(self.odo_fields - 10)]
+        return self.debug(stamp, 'Odometer', values)
+    def line_Location(self, stamp, t):
+        values = ['{0:.6f}'.format(self.x * 1000), '{0:.6f}'.format(self.y * 1000), '{0:.6f}'.format(self.theta * 57.3),
+                  '{0:.6f}'.format(0.8 + self.rng.random() * 0.2), '0', '0', '0', '0']
+        return self.debug(stamp, 'Location', values)
+    def line_Laser(self, stamp, t):
+        rng = self.rng
+        values = [self.ns(t), '-90', '90', '{0:g}'.format(self.step)]
+        for a in self.angles:
+            values.append(a)
+            values.append('1048.58' if rng.random() < 0.05 else '{0:.3f}'.format(0.5 + rng.random() * 30))
+        return self.debug(stamp, 'Laser', values)
+    def line_Send(self, stamp, t):
+        return self.debug(stamp, 'Send', self.floats(4, 1.0) + ['0.500000', '0.349066'])
+    def line_Get(self, stamp, t):
+        return self.debug(stamp, 'Get', self.floats(4, 1.0) + ['0.500000', '0.349066'])
+    def line_Controller(self, stamp, t):
+        rng = self.rng
+        return self.debug(stamp, 'Controller', self.floats(3, 50.0) + ['true' if rng.random() < 0.01 else 'false' for _ in range(6)])
+    def line_Battery(self, stamp, t):
+        rng = self.rng
+        values = ['{0:.6f}'.format(rng.random()), '{0:.6f}'.format(-rng.random() * 2), '{0:.6f}'.format(47 + rng.random()),
+                  'false', '{0:.6f}'.format(20 + rng.random() * 10), str(rng.randrange(500))]
+        return self.debug(stamp, 'Battery', values)
+    def line_Speed2DSP(self, stamp, t):
+        return self.debug(stamp, 'Speed2DSP', self.floats(5, 1.0))
+    def line_Manual(self, stamp, t):
+        return self.debug(stamp, 'Manual', self.floats(4, 1.0))
+    def line_Fork(self, stamp, t):
+        return self.debug(stamp, 'Fork', ['{0:.6f}'.format(self.rng.random() * 2), 'true' if self.rng.random() < 0.5 else 'false'])
+    def line_StopPoints(self, stamp, t):
+        return self.debug(stamp, 'StopPoints', self.floats(2, 10.0) + [str(self.rng.randrange(5)), str(self.rng.randrange(100)), '{0:.6f}'.format(self.rng.random())])
+    def line_SlowDownPoints(self, stamp, t):
+        return self.debug(stamp, 'SlowDownPoints', self.floats(2, 10.0) + [str(self.rng.randrange(5)), str(self.rng.randrange(100)), '{0:.6f}'.format(self.rng.random())])
+    def line_SensorFuserPoints(self, stamp, t):
+        return self.debug(stamp, 'SensorFuserPoints', [str(self.rng.randrange(1000)), str(self.rng.randrange(1000))])
+    def line_LaserOdometer(self, stamp, t):
+        return self.debug(stamp, 'LaserOdometer', [self.ns(t)] + self.floats(3, 10.0))
+    def line_Memory(self, stamp, t):
+        name, unit = self.rng.choice(MEMORY)
+        value = self.rng.random() * (8 if unit == 'GB' else 2000)
+        return '[{0}][info] [Text][{1} : {2:.3f} {3}]\n'.format(stamp, name, value, unit).encode('ascii')
+    def line_Task(self, stamp, t):
+        self.task += 1
+        if self.task % 2:
+            text = 'cnt:{0} task: go to LM{1}'.format(self.task // 2, self.rng.randrange(100))
+        else:
+            text = 'Task finished, cnt:{0}'.format(self.task // 2)
+        return '[{0}][info] [Text][{1}]\n'.format(stamp, text).encode('ascii')
+    def line_Service(self, stamp, t):
+        return '[{0}][debug] [Service][{1}|SoundPlayer]\n'.format(stamp, self.rng.choice(('pause', 'play', 'stop'))).encode('ascii')
+    def line_Alarm(self, stamp, t):
+        level, kind, code, info = self.rng.choice(ALARMS)
+        text = '[{0}][{1}] [Alarm][{2}|{3}|{4}|1]\n'.format(stamp, level, kind, code, info.format(self.rng.random() * 100))
+        return text.encode(self.encoding)
+    def line_DI(self, stamp, t):
+        return self.debug(stamp, 'DI', [str(self.rng.randrange(2)) for _ in range(16)])
+    def line_DO(self, stamp, t):
+        return self.debug(stamp, 'DO', [str(self.rng.randrange(2)) for _ in range(16)])
+    def line_Bad(self, stamp, t):
+        """ 格式不对的行 """
+        rng = self.rng
+        kind = rng.randrange(4)
+        if kind == 0:
+            # 被截断的行
+            line = self.line_Odometer(stamp, t)
+            return line[:rng.randrange(1, len(line) - 1)] + b'\n'
+        if kind == 1:
+            # 没有时间戳的行, 例如上一行的续行
+            return b'    at robokit::core::update() line ' + str(rng.randrange(1000)).encode('ascii') + b'\n'
+        if kind == 2:
+            # 无法解码的行
+            return '[{0}][warning] [Text][bad '.format(stamp).encode('ascii') + b'\xff\xfe\xff' + b' text]\n'
+        # 字段个数不对的行
+        return self.debug(stamp, 'Location', self.floats(3))
+
+def parse_rates(items):
+    """ ["IMU=200", "Laser=0"] 修改 DEFAULT_RATES 中的频率 """
+    rates = dict(DEFAULT_RATES)
+    for item in items or ():
+        tag, _, rate = item.partition('=')
+        if tag not in rates:
+            raise ValueError("unknown tag " + tag)
+        rates[tag] = float(rate)
+    return [(tag, rates[tag]) for tag, _ in DEFAULT_RATES]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Generate a synthetic rbk log")
+    parser.add_argument('output')
+    parser.add_argument('--size', default = '100M', help = "file size, e.g. 100M, 1G")
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--imu-fields', type = int, default = 11, choices = (11, 13))
+    parser.add_argument('--odo-fields', type = int, default = 10, choices = range(10, 15))
+    parser.add_argument('--laser-points', type = int, default = 181)
+    parser.add_argument('--encoding', default = 'gbk')
+    parser.add_argument('--rate', action = 'append', help = "lines per second of a tag, e.g. Laser=30; tags: "
+                        + ", ".join(tag for tag, _ in DEFAULT_RATES))
+    args = parser.parse_args()
+    gen = LogGenerator(args.seed, parse_rates(args.rate), args.imu_fields, args.odo_fields, args.laser_points, args.encoding)
+    size, num = gen.write(args.output, parse_size(args.size))
+    print("Wrote", args.output, size // 1024, "KB", num, "lines")
@@ -1,17 +1,47 @@
 print("LOGGUI START...")
 import matplotlib
 matplotlib.use('Qt5Agg')
+import matplotlib.dates
 from matplotlib.backends.backend_qt5agg import (
     FigureCanvas, NavigationToolbar2QT as NavigationToolbar)
 from PyQt5 import QtCore, QtWidgets,QtGui
 from matplotlib.figure import Figure
 from datetime import datetime
 import os, sys
+import multiprocessing
+import numpy as np
 from numpy import searchsorted
 from ExtendedComboBox import ExtendedComboBox
 from Widget import Widget
 from ReadThread import ReadThread, Fdir2Flink
 from loglib import ErrorLine, WarningLine, ReadLog, FatalLine, NoticeLine, LaserOdometer, TaskStart, TaskFinish, Service
+from loglib import TimeSeries, time64, value_bounds
+from logexpr import ExprError
+
+def abs_seconds(ts, t):
+    """ ts(datetime64数组) 与 t(datetime) 相差的秒数的绝对值 """
+    return np.abs((ts - time64(t)) / np.timedelta64(1, 's'))
+
+def near_content(series, t, dt):
+    """ series(TimeSeries) 中与 t 相差 dt 秒(误差1ms)的内容, 只取 t 附近的一段, 不用遍历全部数据 """
+    span = np.timedelta64(int(dt * 1e6) + 1000, 'us')
+    t = time64(t)
+    window = series.between(t - span, t + span)
+    vdt = abs_seconds(window.times, t)
+    return [window.values[i] for i in np.flatnonzero(np.abs(vdt - dt) < 1e-3)]
+
+def ylimits(values, min_range):
+    """ y轴的显示范围, 上下各留5%, 忽略 nan; 没有有效数据(例如全部为 nan)时返回 None, 不修改y轴 """
+    bounds = value_bounds(np.asarray(values))
+    if bounds is None:
+        return None
+    dmin, dmax = bounds
+    max_range = max(dmax - dmin, min_range)
+    return dmin - 0.05 * max_range, dmax + 0.05 * max_range
+
+def num2time(x):
+    """ matplotlib 的时间坐标转化为 datetime64[us] """
+    return time64(matplotlib.dates.num2date(x))
 
 class ApplicationWindow(QtWidgets.QMainWindow):
     def __init__(self):
@@ -19,9 +49,17 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.finishReadFlag = False
         self.filenames = []
         self.lines_dict = {"fatal":[],"error":[],"warning":[],"notice":[], "taskstart":[], "taskfinish":[], "service":[]} 
+        self.data_lines = dict()
+        self.edited = [] # 输入了表达式, 等待绘制的下拉框
         self.setWindowTitle('Log分析器')
         self.read_thread = ReadThread()
         self.read_thread.signal.connect(self.readFinished)
+        self.read_thread.keys_signal.connect(self.keysReady)
+        self.read_thread.loaded_signal.connect(self.loadFinished)
+        self.read_thread.progress_signal.connect(self.loadProgress)
+        self.read_thread.partial_signal.connect(self.partialLoaded)
+        self.read_thread.polled_signal.connect(self.followPolled)
+        self.read_thread.finished.connect(self.threadFinished)
         self.setupUI()
 
     def setupUI(self):
@@ -33,7 +71,17 @@ class ApplicationWindow(QtWidgets.QMainWindow):
                                  QtCore.Qt.CTRL + QtCore.Qt.Key_O)
         self.file_menu.addAction('&Quit', self.fileQuit,
                                  QtCore.Qt.CTRL + QtCore.Qt.Key_Q)
+        self.follow_action = QtWidgets.QAction('&Follow', self.file_menu, checkable=True)
+        self.follow_action.toggled.connect(self.followToggled)
+        self.file_menu.addAction(self.follow_action)
+        self.profile_action = QtWidgets.QAction('&Profile', self.file_menu, checkable=True)
+        self.profile_action.toggled.connect(self.profileToggled)
+        self.file_menu.addAction(self.profile_action)
         self.menuBar().addMenu(self.file_menu)
+        #跟踪模式下定时读取文件新追加的内容
+        self.follow_timer = QtCore.QTimer(self)
+        self.follow_timer.setInterval(500)
+        self.follow_timer.timeout.connect(self.followUpdate)
 
         self.fig_menu = QtWidgets.QMenu('&Numer', self)
         group = QtWidgets.QActionGroup(self.fig_menu)
@@ -69,6 +117,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
             combo = ExtendedComboBox(self)
             combo.resize(10,10)
             combo.activated.connect(self.combo_onActivated)
+            combo.lineEdit().returnPressed.connect(self.combo_onEdited)
             self.labels.append(label)
             self.combos.append(combo)
             self.grid.addWidget(label,1,i*2)
@@ -158,82 +207,26 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.check_all.stateChanged.connect(self.changeCheckBoxAll)
         self.check_all.setChecked(True)
 
+    def checkedEvents(self):
+        """ 勾选了的事件的解析器, 顺序为 fatal, error, warning, notice, task start, task finish, service """
+        pairs = ((self.read_thread.fatal, self.check_fatal), (self.read_thread.err, self.check_err),
+                 (self.read_thread.war, self.check_war), (self.read_thread.notice, self.check_notice),
+                 (self.read_thread.taskstart, self.check_tstart), (self.read_thread.taskfinish, self.check_tfinish),
+                 (self.read_thread.service, self.check_service))
+        return [p for p, check in pairs if check.isChecked()]
+
     def get_content(self, mouse_time):
-        content = ""
-        dt_min = 1e10
-        if self.read_thread.fatal.t() and self.check_fatal.isChecked():
-            vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.fatal.t()]
-            dt_min = min(vdt)
-        if self.read_thread.err.t() and self.check_err.isChecked(): 
-            vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.err.t()]
-            tmp_dt = min(vdt)
-            if tmp_dt < dt_min:
-                dt_min = tmp_dt
-        if self.read_thread.war.t() and self.check_war.isChecked(): 
-            vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.war.t()]
-            tmp_dt = min(vdt)
-            if tmp_dt < dt_min:
-                dt_min = tmp_dt
-        if self.read_thread.notice.t() and self.check_notice.isChecked(): 
-            vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.notice.t()]
-            tmp_dt = min(vdt)
-            if tmp_dt < dt_min:
-                dt_min = tmp_dt
-        if self.read_thread.taskstart.t() and self.check_tstart.isChecked(): 
-            vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.taskstart.t()]
-            tmp_dt = min(vdt)
-            if tmp_dt < dt_min:
-                dt_min = tmp_dt
-        if self.read_thread.taskfinish.t() and self.check_tfinish.isChecked(): 
-            vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.taskfinish.t()]
-            tmp_dt = min(vdt)
-            if tmp_dt < dt_min:
-                dt_min = tmp_dt
-        if self.read_thread.service.t() and self.check_service.isChecked(): 
-            vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.service.t()]
-            tmp_dt = min(vdt)
-            if tmp_dt < dt_min:
-                dt_min = tmp_dt
-
-        if dt_min < 10:
-            contents = []
-            if self.read_thread.fatal.t() and self.check_fatal.isChecked():
-                vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.fatal.t()]
-                tmp_dt = min(vdt)
-                if abs(tmp_dt - dt_min) < 2e-2:
-                    contents = contents + [self.read_thread.fatal.content()[0][i] for i,val in enumerate(vdt) if abs(val - dt_min) < 1e-3]
-            if self.read_thread.err.t() and self.check_err.isChecked(): 
-                vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.err.t()]
-                tmp_dt = min(vdt)
-                if abs(tmp_dt - dt_min) < 2e-2:
-                    contents = contents + [self.read_thread.err.content()[0][i] for i,val in enumerate(vdt) if abs(val - dt_min) < 1e-3]
-            if self.read_thread.war.t() and self.check_war.isChecked(): 
-                vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.war.t()]
-                tmp_dt = min(vdt)
-                if abs(tmp_dt - dt_min) < 2e-2:
-                    contents = contents + [self.read_thread.war.content()[0][i] for i,val in enumerate(vdt) if abs(val - dt_min) < 1e-3]
-            if self.read_thread.notice.t() and self.check_notice.isChecked(): 
-                vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.notice.t()]
-                tmp_dt = min(vdt)
-                if abs(tmp_dt - dt_min) < 2e-2:
-                    contents = contents + [self.read_thread.notice.content()[0][i] for i,val in enumerate(vdt) if abs(val - dt_min) < 1e-3]
-            if self.read_thread.taskstart.t() and self.check_tstart.isChecked(): 
-                vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.taskstart.t()]
-                tmp_dt = min(vdt)
-                if abs(tmp_dt - dt_min) < 2e-2:
-                    contents = contents + [self.read_thread.taskstart.content()[0][i] for i,val in enumerate(vdt) if abs(val - dt_min) < 1e-3]
-            if self.read_thread.taskfinish.t() and self.check_tfinish.isChecked(): 
-                vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.taskfinish.t()]
-                tmp_dt = min(vdt)
-                if abs(tmp_dt - dt_min) < 2e-2:
-                    contents = contents + [self.read_thread.taskfinish.content()[0][i] for i,val in enumerate(vdt) if abs(val - dt_min) < 1e-3]
-            if self.read_thread.service.t() and self.check_service.isChecked(): 
-                vdt = [abs((tmpt - mouse_time).total_seconds()) for tmpt in self.read_thread.service.t()]
-                tmp_dt = min(vdt)
-                if abs(tmp_dt - dt_min) < 2e-2:
-                    contents = contents + [self.read_thread.service.content()[0][i] for i,val in enumerate(vdt) if abs(val - dt_min) < 1e-3]
-            content = '\n'.join(contents)
-        return content
+        """ 离 mouse_time 最近(10秒以内)的勾选了的事件内容, 时间相同的事件都显示 """
+        series = [p.content() for p in self.checkedEvents() if len(p.t())]
+        if not series:
+            return ""
+        dt_min = min(abs_seconds(s.times[s.nearest(mouse_time)], mouse_time) for s in series)
+        if dt_min >= 10:
+            return ""
+        contents = []
+        for s in series:
+            contents = contents + near_content(s, mouse_time, dt_min)
+        return '\n'.join(contents)
     def mouse_press(self, event):
         # print('%s click: button=%d, x=%d, y=%d, xdata=%f, ydata=%f' %
         #   ('double' if event.dblclick else 'single', event.button,
@@ -265,11 +258,14 @@ class ApplicationWindow(QtWidgets.QMainWindow):
 
     def new_home(self, *args, **kwargs):
         for ax, combo in zip(self.axs, self.combos):
-            text = combo.currentText()
-            data = self.read_thread.data[text][0]
-            if data:
-                max_range = max(max(data) - min(data), 1e-6)
-                ax.set_ylim(min(data) - 0.05 * max_range, max(data)  + 0.05 * max_range)
+            series = self.read_thread.data.get(combo.currentText())
+            if series is None:
+                continue
+            data = series[0]
+            if len(data):
+                ylim = ylimits(data, 1e-6)
+                if ylim is not None:
+                    ax.set_ylim(*ylim)
                 ax.set_xlim(self.read_thread.tlist[0], self.read_thread.tlist[-1])
         self.static_canvas.figure.canvas.draw()
 
@@ -278,17 +274,26 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         range = xmax - xmin
         xmin = xmin + range /10.0
         xmax = xmax + range /10.0
-        for ax in self.axs:
-            ax.set_xlim(xmin,xmax)
-        self.static_canvas.figure.canvas.draw()
+        self.shiftX(xmin, xmax)
 
     def new_back(self, *args, **kwargs):
         xmin,xmax =  self.axs[0].get_xlim()
         range = xmax - xmin
         xmin = xmin - range /10.0
         xmax = xmax - range /10.0
-        for ax in self.axs:
+        self.shiftX(xmin, xmax)
+
+    def shiftX(self, xmin, xmax):
+        """ 所有坐标轴移动到 [xmin, xmax], y轴按窗口内的数据调整 """
+        t1, t2 = num2time(xmin), num2time(xmax)
+        for ax, combo in zip(self.axs, self.combos):
             ax.set_xlim(xmin,xmax)
+            data = self.read_thread.data.get(combo.currentText())
+            if isinstance(data, TimeSeries):
+                window = data.between(t1, t2)
+                ylim = ylimits(window.values, 1e-6) if window.size() else None
+                if ylim is not None:
+                    ax.set_ylim(*ylim)
         self.static_canvas.figure.canvas.draw()
 
     def openFileUrl(self, flink):
@@ -300,9 +305,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         options |= QtCore.Qt.WindowStaysOnTopHint
         self.filenames, _ = QtWidgets.QFileDialog.getOpenFileNames(self,"选取log文件", "","Log Files (*.log);;All Files (*)", options=options)
         if self.filenames:
-            self.finishReadFlag = False
-            self.read_thread.filenames = self.filenames
-            self.read_thread.start()
+            self.startReading()
             print('Loading ', len(self.filenames), ' Files:')
             self.log_info.append('Loading '+str(len(self.filenames)) + ' Files:')
             for (ind, f) in enumerate(self.filenames):
@@ -311,6 +314,18 @@ class ApplicationWindow(QtWidgets.QMainWindow):
                 self.log_info.append(str(ind+1)+':'+flink)
             self.setWindowTitle('Loading')
 
+    def startReading(self):
+        """ 在后台读取 self.filenames, 正在进行的读取先取消 """
+        if self.read_thread.isRunning():
+            print('Cancel loading')
+            self.log_info.append('Cancel loading')
+            self.read_thread.cancel()
+            self.read_thread.wait()
+        self.finishReadFlag = False
+        self.read_thread.filenames = self.filenames
+        self.read_thread.wanted = [combo.currentText() for combo in self.combos]
+        self.read_thread.start()
+
     def dragFiles(self, files):
         self.filenames = []
         for file in files:
@@ -318,9 +333,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
                 if os.path.splitext(file)[1] == ".log":
                     self.filenames.append(file)
         if self.filenames:
-            self.finishReadFlag = False
-            self.read_thread.filenames = self.filenames
-            self.read_thread.start()
+            self.startReading()
             print('Loading', len(self.filenames), 'Files:')
             self.log_info.append('Loading '+str(len(self.filenames)) + ' Files:')
             for (ind, f) in enumerate(self.filenames):
@@ -329,7 +342,138 @@ class ApplicationWindow(QtWidgets.QMainWindow):
                 self.log_info.append(str(ind+1)+':'+flink)
             self.setWindowTitle('Loading')
 
+    def followToggled(self, checked):
+        self.read_thread.follow = checked
+        if checked:
+            print('Follow mode on')
+            self.log_info.append('Follow mode on')
+            if self.filenames and not self.read_thread.isRunning():
+                # 从头读取, 之后只读取新追加的内容
+                self.finishReadFlag = False
+                self.read_thread.filenames = self.filenames
+                self.read_thread.wanted = [combo.currentText() for combo in self.combos]
+                self.read_thread.start()
+                self.setWindowTitle('Loading')
+            self.follow_timer.start()
+        else:
+            print('Follow mode off')
+            self.log_info.append('Follow mode off')
+            self.follow_timer.stop()
+            self.read_thread.follow_log = None
+
+    def profileToggled(self, checked):
+        """ 打开后读取log时在Log窗口显示每个解析器的尝试, 匹配次数和时间
+        打开时不读取也不写入缓存, 多进程解析时的时间为各进程的时间之和
+        """
+        self.read_thread.profile = checked
+        print('Profile', 'on' if checked else 'off')
+        self.log_info.append('Profile ' + ('on' if checked else 'off'))
+
+    def eventNum(self):
+        return len(self.read_thread.fatal.t()) + len(self.read_thread.err.t()) + len(self.read_thread.war.t()) + \
+            len(self.read_thread.notice.t()) + len(self.read_thread.taskstart.t()) + len(self.read_thread.taskfinish.t()) + \
+            len(self.read_thread.service.t())
+
+    def followUpdate(self):
+        """ 跟踪模式下在后台线程中读取新追加的log, 完成后在 followPolled 中更新曲线, 界面不会卡住 """
+        if not self.finishReadFlag or self.read_thread.isRunning():
+            return
+        self.read_thread.start_poll()
+
+    def followPolled(self, result):
+        """ 合并后台读取的新数据, 只更新曲线的数据, 不重新绘制坐标轴 """
+        load_id, num = result
+        if load_id != self.read_thread.load_id or not self.finishReadFlag:
+            return
+        event_num = self.eventNum()
+        t_end = self.read_thread.tlist[-1] if self.read_thread.tlist else None
+        self.read_thread.merge_follow()
+        if num == 0:
+            return
+        redraw = event_num != self.eventNum()
+        for ax, combo in zip(self.axs, self.combos):
+            text = combo.currentText()
+            if text not in self.read_thread.data:
+                continue
+            data = self.read_thread.data[text]
+            line = self.data_lines.get(ax)
+            if redraw or line is None:
+                # 有新的报警时需要重新绘制竖线
+                self.drawdata(ax, data, text, t_end is None)
+                continue
+            line.set_data(data[1], data[0])
+            ylim = ylimits(data[0], 1.0) if len(data[0]) else None
+            if ylim is not None:
+                ax.set_ylim(*ylim)
+        # 显示范围包含之前的最后时刻时, 随新数据向右滚动
+        if t_end is not None:
+            xmin, xmax = self.axs[0].get_xlim()
+            end = matplotlib.dates.date2num(t_end)
+            if xmax >= end:
+                shift = matplotlib.dates.date2num(self.read_thread.tlist[-1]) - end
+                for ax in self.axs:
+                    ax.set_xlim(xmin + shift, xmax + shift)
+        self.static_canvas.figure.canvas.draw_idle()
+
+    def loadProgress(self, info):
+        """ 在标题栏显示读取进度 """
+        if info['id'] != self.read_thread.load_id or self.finishReadFlag:
+            return
+        title = 'Loading {0:.0f}%, {1:.0f} lines/s'.format(100.0 * info['done'] / max(info['total'], 1), info['lines_per_sec'])
+        if info['eta'] is not None:
+            title += ', {0:.0f} s left'.format(info['eta'])
+        self.setWindowTitle(title)
+
+    def partialLoaded(self, load_id):
+        """ 读取过程中绘制已解析的部分, 事件等读取完成后再绘制 """
+        if load_id != self.read_thread.load_id or self.finishReadFlag:
+            return
+        for ax, combo in zip(self.axs, self.combos):
+            text = combo.currentText()
+            if text in self.read_thread.data:
+                self.drawdata(ax, self.read_thread.data[text], text, True, events = False)
+
+    def keysReady(self, keys):
+        """ 解析完成前先用索引填充下拉框 """
+        for combo in self.combos:
+            if combo.count() == 0:
+                combo.addItems(keys)
+
+    def loadFinished(self, names):
+        """ load_keys 请求的通道解析完成, 重新绘制 """
+        for tmps in self.read_thread.log:
+            self.log_info.append(tmps)
+        if not names:
+            return
+        self.log_info.append('Loaded ' + ', '.join(names))
+        for ax, combo in zip(self.axs, self.combos):
+            text = combo.currentText()
+            if text in self.read_thread.data:
+                self.drawdata(ax, self.read_thread.data[text], text, False)
+
+    def threadFinished(self):
+        # 读取过程中选择的通道等读取完成后再解析
+        if self.read_thread.pending:
+            self.read_thread.start()
+
+    def drawCombo(self, ax, combo, resize):
+        """ 绘制下拉框选中的通道, 通道还没有解析时在后台解析, 完成后在 loadFinished 中重新绘制 """
+        text = combo.currentText()
+        if self.read_thread.load_keys([text]):
+            print('Loading', text)
+            self.log_info.append('Loading ' + text)
+        try:
+            data = self.read_thread.data.evaluate(text)
+        except ExprError as e:
+            print(e)
+            self.log_info.append(str(e))
+            return
+        self.drawdata(ax, data, text, resize)
+
     def readFinished(self, result):
+        if result != self.read_thread.filenames:
+            # 已取消的读取
+            return
         for tmps in self.read_thread.log:
             self.log_info.append(tmps)
         print('Finished')
@@ -371,7 +515,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
             for ax, combo in zip(self.axs, self.combos):
                 if combo.count() == 0:
                     combo.addItems(keys)
-                self.drawdata(ax, self.read_thread.data[combo.currentText()],combo.currentText(), True)
+                self.drawCombo(ax, combo, True)
 
     def fileQuit(self):
         self.close()
@@ -386,7 +530,22 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         text = curcombo.currentText()
         # print("index:", index, "sender:", self.sender()," text:", text)
         ax = self.axs[index]
-        self.drawdata(ax, self.read_thread.data[text], text, False)
+        self.drawCombo(ax, curcombo, False)
+
+    def combo_onEdited(self):
+        """ 在下拉框中输入通道名或表达式(如 mcl.x - odo.x)后回车, 绘制结果
+        带有 completer 的下拉框回车时 returnPressed 会发出两次, 合并为一次绘制
+        """
+        for combo in self.combos:
+            if combo.lineEdit() is self.sender() and combo not in self.edited:
+                self.edited.append(combo)
+                QtCore.QTimer.singleShot(0, self.drawEdited)
+
+    def drawEdited(self):
+        edited, self.edited = self.edited, []
+        for ax, combo in zip(self.axs, self.combos):
+            if combo in edited and combo.findText(combo.currentText()) < 0:
+                self.drawCombo(ax, combo, False)
 
     def fignum_changed(self,action):
         new_fig_num = int(action.text())
@@ -413,6 +572,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
             combo = ExtendedComboBox(self)
             combo.resize(10,10)
             combo.activated.connect(self.combo_onActivated)
+            combo.lineEdit().returnPressed.connect(self.combo_onEdited)
             self.labels.append(label)
             self.combos.append(combo)
             self.grid.addWidget(label,1,i*2)
@@ -431,18 +591,22 @@ class ApplicationWindow(QtWidgets.QMainWindow):
                         combo.setCurrentIndex(combo_ind[count])
                     count = count + 1
                     ax.set_xlim(xmin, xmax)
-                    self.drawdata(ax, self.read_thread.data[combo.currentText()],combo.currentText(), False)
+                    self.drawCombo(ax, combo, False)
 
-    def drawdata(self, ax, data, ylabel, resize = False):
+    def drawdata(self, ax, data, ylabel, resize = False, events = True):
         xmin,xmax =  ax.get_xlim()
         ax.cla()
-        self.drawFEWN(ax)
-        if data[1] and data[0]:
-            ax.plot(data[1], data[0], '.')
-            max_range = max(max(data[0]) - min(data[0]), 1.0)
-            ax.set_ylim(min(data[0]) - 0.05 * max_range, max(data[0]) + 0.05 * max_range)
+        if events:
+            self.drawFEWN(ax)
+        self.data_lines.pop(ax, None)
+        if len(data[1]) and len(data[0]):
+            self.data_lines[ax] = ax.plot(data[1], data[0], '.')[0]
+            ylim = ylimits(data[0], 1.0)
+            if ylim is not None:
+                ax.set_ylim(*ylim)
         if resize:
-            ax.set_xlim(self.read_thread.tlist[0], self.read_thread.tlist[-1])
+            if self.read_thread.tlist:
+                ax.set_xlim(self.read_thread.tlist[0], self.read_thread.tlist[-1])
         else:
             ax.set_xlim(xmin, xmax)
         ax.set_ylabel(ylabel)
@@ -593,6 +757,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
             self.check_service.setChecked(False)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     qapp = QtWidgets.QApplication(sys.argv)
     app = ApplicationWindow()
     app.show()
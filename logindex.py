@@ -0,0 +1,150 @@
+""" log文件的稀疏索引
+每隔 step 字节记录一个 (时间戳, 行首位置), 以及每个 (等级, 标签) 的行数和第一次/最后一次出现的位置.
+索引只需要扫描一遍文件, 保存在缓存目录中, 用于:
+    按时间快速定位到文件中的位置 (ReadLog.indexes, loglib.time_range)
+    不解析文件就知道文件中有哪些标签, 各有多少行
+用法: python logindex.py test1.log test2.log   建立索引并显示各标签的行数
+"""
+import os
+import re
+import sys
+import json
+import mmap
+import hashlib
+from collections import Counter
+import numpy as np
+from loglib import line_stamp
+from logcache import default_root
+
+INDEX_STEP = 64 * 1024
+# 与 loglib.linetags 相同: 第一个 "][" 之后为等级, 紧跟的 " [...]" 为标签
+_LINE_TAGS = re.compile(rb'^[^\n]*?\]\[([^\]\n]*)\](?: \[([^\]\n]*)\])?', re.M)
+
+def last_stamp(mm, size):
+    """ 从文件末尾向前找最后一个带时间戳的行, 返回时间(微秒) """
+    end = size
+    while end > 0:
+        start = mm.rfind(b'\n', 0, end - 1) + 1
+        _, t = line_stamp(mm, start, end)
+        if t is not None:
+            return t
+        end = start
+    return None
+
+class LogIndex:
+    """ 一个log文件的稀疏索引
+    times, offsets: 每隔 step 字节第一个带时间戳的行的时间(微秒)和行首位置
+    tags: {(等级, 标签): [行数, 第一次出现的位置, 最后一次出现的位置]}, 位置精确到 step 字节的块
+    last: 最后一个带时间戳的行的时间(微秒), 没有时为 None
+    size, mtime_ns: 建立索引时文件的大小和修改时间, 用于判断索引是否过期
+    """
+    def __init__(self, filename, step = INDEX_STEP):
+        self.filename = filename
+        self.step = step
+        self.size = 0
+        self.mtime_ns = 0
+        self.times = np.empty(0, dtype = np.int64)
+        self.offsets = np.empty(0, dtype = np.int64)
+        self.tags = dict()
+        self.last = None
+    def build(self):
+        """ 扫描一遍文件建立索引, 标签用正则按块统计 """
+        st = os.stat(self.filename)
+        self.size, self.mtime_ns = st.st_size, st.st_mtime_ns
+        times, offsets = [], []
+        self.tags = dict()
+        if self.size == 0:
+            return self
+        with open(self.filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+            pos = 0
+            while pos < self.size:
+                end = mm.find(b'\n', pos + self.step) + 1
+                if end == 0:
+                    end = self.size
+                p, t = line_stamp(mm, pos, end)
+                if t is not None:
+                    times.append(t)
+                    offsets.append(p)
+                for (level, tag), n in Counter(_LINE_TAGS.findall(mm, pos, end)).items():
+                    key = (level.decode('utf-8', 'replace'), tag.decode('utf-8', 'replace') if tag else None)
+                    info = self.tags.get(key)
+                    if info is None:
+                        self.tags[key] = [n, pos, pos]
+                    else:
+                        info[0] += n
+                        info[2] = pos
+                pos = end
+            self.last = last_stamp(mm, self.size)
+        self.times = np.array(times, dtype = np.int64)
+        self.offsets = np.array(offsets, dtype = np.int64)
+        return self
+    def time_bounds(self):
+        """ 文件中第一个和最后一个时间戳(微秒), 没有时间戳时返回 None """
+        if len(self.times) == 0:
+            return None
+        return int(self.times[0]), self.last
+    def bounds(self, t):
+        """ 时间戳 >= t(微秒) 的第一行所在的字节区间 (lo, hi) """
+        i = np.searchsorted(self.times, t, 'left')
+        lo = int(self.offsets[i - 1]) if i > 0 else 0
+        hi = int(self.offsets[i]) if i < len(self.offsets) else self.size
+        return lo, hi
+    def count(self, tags):
+        """ 等级或标签在 tags 中的行数, tags 与解析器的 tags 属性相同 """
+        return sum(info[0] for (level, tag), info in self.tags.items() if level in tags or tag in tags)
+    def tag_counts(self):
+        """ {标签: 行数}, 没有标签的行按等级统计 """
+        out = Counter()
+        for (level, tag), info in self.tags.items():
+            out[tag or level] += info[0]
+        return dict(out)
+    def save(self, path):
+        np.savez(path, times = self.times, offsets = self.offsets)
+        with open(path + '.json', 'w', encoding = 'utf-8') as f:
+            json.dump({'filename': os.path.abspath(self.filename), 'step': self.step, 'size': self.size,
+                       'mtime_ns': self.mtime_ns, 'last': self.last,
+                       'tags': [[level, tag] + info for (level, tag), info in self.tags.items()]}, f)
+    def load(self, path):
+        with open(path + '.json', encoding = 'utf-8') as f:
+            meta = json.load(f)
+        with np.load(path + '.npz') as arrays:
+            self.times = arrays['times']
+            self.offsets = arrays['offsets']
+        self.step = meta['step']
+        self.size = meta['size']
+        self.mtime_ns = meta['mtime_ns']
+        self.last = meta['last']
+        self.tags = dict(((level, tag), info) for level, tag, *info in meta['tags'])
+        return self
+
+def index_path(filename, root = None):
+    """ 索引文件的路径(不含扩展名), 按文件的绝对路径命名, 文件被修改后覆盖原来的索引 """
+    key = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()
+    return os.path.join(root or default_root(), 'index', key)
+
+def get_index(filename, root = None, build = True):
+    """ 读取文件的索引, 没有或者文件的大小, 修改时间已改变时建立并保存; build 为 False 时没有索引返回 None """
+    path = index_path(filename, root)
+    try:
+        st = os.stat(filename)
+        index = LogIndex(filename).load(path)
+        if index.size == st.st_size and index.mtime_ns == st.st_mtime_ns:
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    if not build:
+        return None
+    index = LogIndex(filename).build()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        index.save(path)
+    except OSError as e:
+        print("Failed to write index for", filename, e)
+    return index
+
+if __name__ == '__main__':
+    for f in sys.argv[1:]:
+        index = get_index(f)
+        print(f, ":", len(index.offsets), "index points")
+        for tag, n in sorted(index.tag_counts().items(), key = lambda x: -x[1]):
+            print("    {0:24s} {1}".format(str(tag), n))
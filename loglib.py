@@ -1,55 +1,1379 @@
 import re
+import os
 import math
-from datetime import datetime
+import copy
+import io
+import mmap
+import time
+import multiprocessing
+from collections import OrderedDict, namedtuple
+from array import array
+from datetime import datetime, timedelta
 import codecs
 import chardet
+import numpy as np
 
-def rbktimetodate(rbktime):
-    """ 将rbk的时间戳转化为datatime """
-    return datetime.strptime(rbktime, '%Y-%m-%d %H:%M:%S.%f')
+RBK_TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+EPOCH = datetime(1970, 1, 1)
+_DOTS = ('.', b'.')
+
+class RbkTimeDecoder:
+    """ rbk时间戳解码
+    时间戳为定长的 "YYYY-MM-DD HH:MM:SS.ffffff", 直接按位置切片解析, 支持 str 和 bytes.
+    相邻的行大多在同一秒内, 因此缓存上一次的 "YYYY-MM-DD HH:MM:SS" 部分.
+    格式不对的时间戳回退到 strptime
+    """
+    def __init__(self):
+        self.prefix = None
+        self.base = None
+        self.base_us = 0
+    def _load_prefix(self, prefix):
+        """ 解析并缓存 "YYYY-MM-DD HH:MM:SS" 部分, 格式不对时返回False """
+        text = prefix
+        if isinstance(text, bytes):
+            text = text.decode('ascii', 'replace')
+        if (text[4] != '-' or text[7] != '-' or text[10] != ' ' or text[13] != ':' or text[16] != ':'
+            or not (text[0:4] + text[5:7] + text[8:10] + text[11:13] + text[14:16] + text[17:19]).isdigit()):
+            return False
+        try:
+            base = datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                            int(text[11:13]), int(text[14:16]), int(text[17:19]))
+        except ValueError:
+            return False
+        self.prefix = prefix
+        self.base = base
+        self.base_us = (base - EPOCH) // timedelta(microseconds = 1)
+        return True
+    def _strptime(self, rbktime):
+        if isinstance(rbktime, bytes):
+            rbktime = rbktime.decode('ascii')
+        return datetime.strptime(rbktime, RBK_TIME_FORMAT)
+    def todate(self, rbktime):
+        """ 将rbk的时间戳转化为datatime """
+        if len(rbktime) == 26 and rbktime[19:20] in _DOTS and rbktime[20:].isdigit():
+            prefix = rbktime[:19]
+            if prefix == self.prefix or self._load_prefix(prefix):
+                return self.base.replace(microsecond = int(rbktime[20:]))
+        return self._strptime(rbktime)
+    def tous(self, rbktime):
+        """ 将rbk的时间戳转化为1970-01-01起的微秒数(int) """
+        if len(rbktime) == 26 and rbktime[19:20] in _DOTS and rbktime[20:].isdigit():
+            prefix = rbktime[:19]
+            if prefix == self.prefix or self._load_prefix(prefix):
+                return self.base_us + int(rbktime[20:])
+        return (self._strptime(rbktime) - EPOCH) // timedelta(microseconds = 1)
+
+_rbktime = RbkTimeDecoder()
+rbktimetodate = _rbktime.todate
+rbktimetous = _rbktime.tous
+
+ENCODING_SAMPLE_SIZE = 64 * 1024
+ENCODING_SAMPLES = 4
+_CJK_ENCODINGS = ('gb2312', 'gbk', 'gb18030', 'big5', 'euc-jp', 'euc-kr', 'shift_jis', 'cp932', 'cp949')
+
+def detect_encoding(filename):
+    """ 抽样文件开头和中间的几段, 判断文件的编码
+    只用含非ASCII字符的行投票: 每行记为 utf-8, gbk(不是utf-8但是合法的gbk) 或其他,
+    utf-8 或 gbk 的票数最多时为该编码, 没有非ASCII字符时为utf-8; 否则(票数相同或其他最多)用chardet判断, 默认为gbk
+    """
+    size = os.path.getsize(filename)
+    lines = []
+    with open(filename, 'rb') as f:
+        for k in range(ENCODING_SAMPLES):
+            offset = size * k // ENCODING_SAMPLES
+            f.seek(offset)
+            block = f.read(ENCODING_SAMPLE_SIZE)
+            if offset > 0:
+                block = block[block.find(b'\n') + 1:]
+            if offset + ENCODING_SAMPLE_SIZE < size:
+                block = block[:block.rfind(b'\n') + 1]
+            lines.extend(line for line in block.split(b'\n') if not line.isascii())
+    if not lines:
+        return 'utf-8'
+    votes = {'utf-8': [], 'gbk': [], None: []}
+    for line in lines:
+        for encoding in ('utf-8', 'gbk', None):
+            try:
+                if encoding:
+                    line.decode(encoding)
+                votes[encoding].append(line)
+                break
+            except UnicodeDecodeError:
+                pass
+    utf8, gbk, other = len(votes['utf-8']), len(votes['gbk']), len(votes[None])
+    if utf8 > gbk and utf8 > other:
+        return 'utf-8'
+    if gbk > utf8 and gbk > other:
+        return 'gbk'
+    sample = votes[None] if other > max(utf8, gbk) else lines
+    encoding = (chardet.detect(b'\n'.join(sample))['encoding'] or '').lower()
+    if encoding in ('utf-8', 'ascii'):
+        return 'utf-8'
+    if encoding in ('gb2312', 'gb18030'):
+        return 'gbk'
+    if encoding in _CJK_ENCODINGS:
+        return encoding
+    return 'gbk'
+
+class TextDecoder:
+    """ 文本字段解码
+    先用文件的编码解码, 失败时回退到 utf-8 或 gbk 并计数, 都失败时抛出 UnicodeDecodeError
+    """
+    def __init__(self, encoding = 'utf-8'):
+        self.reset(encoding)
+    def reset(self, encoding):
+        self.encoding = encoding
+        self.fallback = 'gbk' if codecs.lookup(encoding).name == 'utf-8' else 'utf-8'
+        self.fallbacks = 0
+    def decode(self, raw):
+        try:
+            return raw.decode(self.encoding)
+        except UnicodeDecodeError:
+            self.fallbacks += 1
+            return raw.decode(self.fallback)
+
+_text = TextDecoder()
+
+def decode_text(raw):
+    """ 将log中的文本字段按当前文件的编码解码, 失败时回退到 utf-8 或 gbk """
+    return _text.decode(raw)
 
 def findrange(ts, t1, t2):
-    """ 在ts中寻找大于t1小于t2对应的下标 """
-    small_ind = -1
-    large_ind = len(ts)-1
-    for i, data in enumerate(ts):
-        large_ind = i
-        if(t1 <= data and small_ind < 0):
-            small_ind = i
-        if(t2 <= data):
-            break
+    """ 在ts中寻找大于t1小于t2对应的下标, ts 为升序的时间, 用二分查找
+    返回 (第一个 >= t1 的下标, 没有时为-1; 第一个 >= t2 的下标, 没有时为最后一个下标)
+    """
+    series = TimeSeries(ts, as_times(ts))
+    large_ind = min(series.search(t2), series.size() - 1)
+    small_ind = series.search(t1)
+    if small_ind > large_ind:
+        small_ind = -1
     return small_ind, large_ind
 
 def polar2xy(angle, dist):
     """ 将极坐标angle,dist 转化为xy坐标 """
-    x , y = [], []
-    for a, d in zip(angle, dist):
-        x.append(d * math.cos(a))
-        y.append(d * math.sin(a))
-    return x,y
+    angle = np.asarray(angle)
+    dist = np.asarray(dist)
+    return dist * np.cos(angle), dist * np.sin(angle)
+
+TIME_DTYPE = 'datetime64[us]'
+EXTEND_TAIL_SIZE = 64 * 1024
+_NP_TYPES = {'d': np.float64, 'f': np.float32, 'q': np.int64}
+
+def value_bounds(values):
+    """ numpy 数组的 (最小值, 最大值), 忽略 nan, 空数组或者全部为 nan 时返回 None """
+    if len(values) == 0:
+        return None
+    if values.dtype.kind == 'f':
+        lo = np.fmin.reduce(values)
+        if np.isnan(lo):
+            return None
+        return lo.item(), np.fmax.reduce(values).item()
+    return values.min().item(), values.max().item()
+
+def merge_bounds(a, b):
+    """ 合并两个 (最小值, 最大值), None 表示没有数据 """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), max(a[1], b[1])
+
+class Column:
+    """ 一个通道的列存储
+    追加的数据先写入 array.array(紧凑, 追加快), 取数时合并成 numpy 数组.
+    typecode: 'd' float64, 'f' float32, 'q' int64
+    view: 取数时的 numpy 类型, 时间列存 int64 微秒, 取出为 datetime64[us]
+    limits: 已合并到 head 的数据的 (最小值, 最大值), 追加时更新, bounds() 不需要遍历整列
+    """
+    def __init__(self, typecode = 'd', view = None):
+        self.typecode = typecode
+        self.view = view
+        self.head = np.empty(0, dtype = _NP_TYPES[typecode])
+        self.buf = None # 预留了空间的数组, head 为它的前一段, 为 None 时 head 没有预留空间
+        self.tail = array(typecode)
+        self.append = self.tail.append
+        self.limits = None
+    def __getstate__(self):
+        self._flush()
+        state = self.__dict__.copy()
+        del state['append']
+        state['buf'] = None
+        return state
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.append = self.tail.append
+    def _flush(self):
+        n = len(self.tail)
+        if n == 0:
+            return
+        values = np.frombuffer(self.tail, dtype = self.head.dtype)
+        self.limits = merge_bounds(self.limits, value_bounds(values))
+        size = len(self.head)
+        if size == 0:
+            self.head = values.copy()
+        else:
+            # 跟踪模式下会多次追加少量数据, 按1.5倍预留空间, 避免每次复制整列
+            # 只写入 head 之后的空闲位置, 之前返回的数组不受影响
+            if self.buf is None or len(self.buf) < size + n:
+                self.buf = np.empty(int((size + n) * 1.5), dtype = self.head.dtype)
+                self.buf[:size] = self.head
+            self.buf[size:size + n] = values
+            self.head = self.buf[:size + n]
+        del values
+        del self.tail[:]
+    def extend(self, values):
+        """ 追加一批数据, values 可以是 Column, numpy 数组或者列表 """
+        if isinstance(values, Column):
+            values = values.array()
+        values = np.asarray(values)
+        if self.view and values.dtype.kind == 'M':
+            values = values.astype(self.view).view(np.int64)
+        values = values.astype(self.head.dtype, copy = False)
+        if len(self.head) == 0 and len(self.tail) == 0:
+            # head 只会被整体替换, 不会原地修改, 因此可以直接共享
+            self.head = values
+            self.buf = None
+            self.limits = value_bounds(values)
+        elif len(values) < EXTEND_TAIL_SIZE:
+            # 少量数据(例如一帧激光)先写入 tail, 避免每次复制整列
+            self.tail.frombytes(values.tobytes())
+        else:
+            self._flush()
+            self.buf = None
+            self.head = np.concatenate((self.head, values))
+            self.limits = merge_bounds(self.limits, value_bounds(values))
+    def scale(self, k, start = 0):
+        """ 第 start 行之后的数据乘以 k """
+        self._flush()
+        self.buf = None
+        if start == 0:
+            self.head = self.head * k
+        else:
+            self.head = np.concatenate((self.head[:start], self.head[start:] * k))
+        self.limits = value_bounds(self.head)
+    def bounds(self, start = 0):
+        """ 第 start 行之后数据的 (最小值, 最大值), 没有数据时返回 None
+        start 为 0 时用 limits 和 tail 计算, 不合并 tail
+        """
+        if start > 0:
+            self._flush()
+            return value_bounds(self.head[start:])
+        if len(self.tail) == 0:
+            return self.limits
+        values = np.frombuffer(self.tail, dtype = self.head.dtype)
+        out = merge_bounds(self.limits, value_bounds(values))
+        # 释放对 tail 的引用, 否则 tail 不能再追加
+        del values
+        return out
+    def array(self):
+        """ 返回 numpy 数组 """
+        self._flush()
+        if self.view:
+            return self.head.view(self.view)
+        return self.head
+    def __len__(self):
+        return len(self.head) + len(self.tail)
+    def __getitem__(self, k):
+        return self.array()[k]
+    def __iter__(self):
+        return iter(self.array())
+
+def time_column():
+    """ 时间列, 存储为 int64 微秒 """
+    return Column('q', TIME_DTYPE)
+
+def columns(n, flags = ()):
+    """ n列的存储, 第0列为时间, flags 中的列为 float32 的标志位 """
+    return [time_column()] + [Column('f' if i in flags else 'd') for i in range(1, n)]
+
+def fill_missing(data):
+    """ 字段缺少或者无效的行: 比 t(data[0]) 短的列补 nan, 使每一列都与 t 等长, 按行计算时不会错位 """
+    n = len(data[0])
+    for column in data[1:]:
+        if len(column) < n:
+            column.append(math.nan)
+
+def aslist(series):
+    """ 兼容旧代码: 将访问函数返回的 (values, times) 转换为 (list, list of datetime) """
+    return tuple(np.asarray(v).tolist() for v in series)
+
+def time64(t):
+    """ datetime, datetime64, 微秒数或者rbk的时间戳字符串转化为 datetime64[us]
+    带时区的 datetime(例如 matplotlib.dates.num2date 的结果) 按 UTC 去掉时区, 与 matplotlib 的坐标一致
+    """
+    if isinstance(t, (str, bytes)):
+        return np.datetime64(rbktimetous(t), 'us')
+    if isinstance(t, datetime) and t.tzinfo is not None:
+        t = (t - t.utcoffset()).replace(tzinfo = None)
+    return np.datetime64(t, 'us')
+
+def as_times(ts):
+    """ 时间列表或数组转化为 datetime64[us] 数组, 已经是 datetime64[us] 数组时不复制 """
+    if isinstance(ts, np.ndarray) and ts.dtype == np.dtype(TIME_DTYPE):
+        return ts
+    if len(ts) and isinstance(ts[0], (str, bytes)):
+        return np.array([rbktimetous(t) for t in ts], dtype = np.int64).view(TIME_DTYPE)
+    return np.asarray(ts, dtype = TIME_DTYPE)
+
+class TimeSeries(tuple):
+    """ 一个通道的数据, 与原来访问函数返回的 (values, times) 兼容: v, t = series; series[0]; series[1]
+    times: 升序的 datetime64[us] 数组, values: 等长的数组或者列表
+    series[i:j], between 返回原数组的视图, 不复制数据; 时间参数可以是 datetime, datetime64 或者rbk的时间戳字符串
+    """
+    __slots__ = ()
+    def __new__(cls, values, times):
+        return tuple.__new__(cls, (values, times))
+    def __getnewargs__(self):
+        return tuple(self)
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return TimeSeries(self.values[k], self.times[k])
+        return tuple.__getitem__(self, k)
+    @property
+    def values(self):
+        return tuple.__getitem__(self, 0)
+    @property
+    def times(self):
+        return tuple.__getitem__(self, 1)
+    def size(self):
+        """ 数据点的个数 """
+        return len(self.times)
+    def search(self, t, side = 'left'):
+        """ 二分查找 t 在 times 中的位置, 同 numpy.searchsorted """
+        return int(np.searchsorted(self.times, time64(t), side))
+    def between(self, t1 = None, t2 = None):
+        """ t1 <= t <= t2 的数据, None 表示不限 """
+        i = self.search(t1) if t1 is not None else 0
+        j = self.search(t2, 'right') if t2 is not None else self.size()
+        return self[i:j]
+    def nearest(self, t):
+        """ 离 t 最近的数据点的下标, 不访问 values, 没有数据时抛出 IndexError """
+        n = self.size()
+        if n == 0:
+            raise IndexError("empty time series")
+        t = time64(t)
+        i = self.search(t)
+        if i == n or (i > 0 and t - self.times[i - 1] <= self.times[i] - t):
+            i -= 1
+        return i
+    def at(self, t):
+        """ 离 t 最近的数据点 (value, time), 没有数据时抛出 IndexError; 只需要时间时用 times[nearest(t)] """
+        i = self.nearest(t)
+        return self.values[i], self.times[i]
+    def resample(self, times):
+        """ 线性插值到新的时间上
+        times: 时间数组, 或者时间间隔(秒数, timedelta, timedelta64), 此时从第一个数据点开始等间隔取点
+        """
+        if not isinstance(times, (np.ndarray, list, tuple)):
+            if self.size() == 0:
+                return TimeSeries(np.empty(0), self.times[:0])
+            step = np.timedelta64(int(round(times * 1e6)), 'us') if isinstance(times, (int, float)) else np.timedelta64(times, 'us')
+            if step <= np.timedelta64(0, 'us'):
+                raise ValueError("resample step must be positive")
+            times = np.arange(self.times[0], self.times[-1] + np.timedelta64(1, 'us'), step)
+        times = as_times(times)
+        if self.size() == 0:
+            return TimeSeries(np.full(len(times), np.nan), times)
+        x = self.times.view(np.int64)
+        values = np.interp(times.view(np.int64), x, np.asarray(self.values, dtype = np.float64))
+        return TimeSeries(values, times)
+
+class TimeAxis:
+    """ 等间隔的时间轴, 第 k 个时刻为 start + k * step (datetime)
+    只保存起点, 间隔和个数, 下标, 切片, 长度和遍历都由计算得到, 内存与时间跨度无关
+    """
+    def __init__(self, start = None, stop = None, step = timedelta(milliseconds = 1)):
+        """ 从 start 开始, 直到最后一个时刻不小于 stop; start 为 None 时为空的时间轴 """
+        self.start = start
+        self.step = step
+        self.n = 0 if start is None else 1
+        if start is not None and stop is not None:
+            self.extend_to(stop)
+    def extend_to(self, t):
+        """ 延长时间轴直到最后一个时刻不小于 t """
+        if self.start is None:
+            self.start = t
+            self.n = 1
+            return
+        n = -((self.start - t) // self.step) + 1
+        if n > self.n:
+            self.n = n
+    def bounds(self):
+        """ (第一个时刻, 最后一个时刻), 空的时间轴返回 (None, None) """
+        if self.n == 0:
+            return None, None
+        return self[0], self[-1]
+    def __len__(self):
+        return self.n
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            start, stop, step = k.indices(self.n)
+            out = TimeAxis(step = self.step * step)
+            n = len(range(start, stop, step))
+            if n > 0:
+                out.start = self.start + start * self.step
+                out.n = n
+            return out
+        if k < 0:
+            k += self.n
+        if k < 0 or k >= self.n:
+            raise IndexError("time axis index out of range")
+        return self.start + k * self.step
+    def __iter__(self):
+        for k in range(self.n):
+            yield self.start + k * self.step
+    def __repr__(self):
+        first, last = self.bounds()
+        return 'TimeAxis({0}, {1}, {2}, n = {3})'.format(first, last, self.step, self.n)
+
+def linetags(line):
+    """ 取出一行原始log(bytes)的等级和第一个标签
+    如 b"[2018-12-24 14:55:49.954423][debug] [Odometer][...]" 返回 (b"debug", b"Odometer")
+    没有标签的行返回 (等级, None), 格式不对的行返回 (None, None)
+    """
+    i = line.find(b'][')
+    if i < 0:
+        return None, None
+    j = line.find(b']', i + 2)
+    if j < 0:
+        return None, None
+    level = line[i + 2:j]
+    if line.startswith(b' [', j + 1):
+        k = line.find(b']', j + 3)
+        if k > 0:
+            return level, line[j + 3:k]
+    return level, None
+
+class TagDispatcher:
+    """ 按标签分发log行
+    解析器的 tags 属性给出它关心的标签(如 "Odometer")或等级(如 "error"),
+    每一行只取一次标签, 通过哈希表找到关心它的解析器, 只运行这些解析器.
+    没有 tags 属性的解析器对所有行都运行, 保持原来的行为.
+    binary 为 True 的解析器直接解析原始的 bytes 行, 其他解析器解析解码后的 str 行
+    positional 为 True 的解析器还需要行的位置, 调用 parse(line, (文件名, 行首的字节位置))
+    """
+    def __init__(self, parsers):
+        self.parsers = parsers
+        self.table = dict()
+    def candidates(self, level, tag):
+        """ 返回 (关心 (level, tag) 的解析器, 是否需要解码, 是否需要行的位置), 解析器保持传入的顺序 """
+        key = (level, tag)
+        out = self.table.get(key)
+        if out is None:
+            if level is not None:
+                level = level.decode('utf-8', 'replace')
+            if tag is not None:
+                tag = tag.decode('utf-8', 'replace')
+            parsers = []
+            for p in self.parsers:
+                tags = getattr(p, 'tags', None)
+                if tags is None or level in tags or tag in tags:
+                    parsers.append(p)
+            text = not all(getattr(p, 'binary', False) for p in parsers)
+            positional = any(getattr(p, 'positional', False) for p in parsers)
+            out = (tuple(parsers), text, positional)
+            self.table[key] = out
+        return out
+
+SCHEMA_VERSION = 11 # 解析器存储格式的版本, 修改解析器的数据结构时需要加1, 使旧的缓存失效
+
+def parser_table():
+    """ ReadThread 使用的全部解析器 [(属性名, 解析器)], 同一标签的解析器按此顺序尝试
+    logcache build 和 bench 也用这些解析器, 解析器的缓存键相同, 预先建立的缓存在界面中可以直接使用
+    """
+    return [('mcl', MCLoc()), ('imu', IMU()), ('odo', Odometer()), ('battery', Battery()), ('controller', Controller()),
+            ('laserOdo', LaserOdometer()), ('stop', StopPoints()), ('slowdown', SlowDownPoints()), ('sensorfuser', SensorFuser()),
+            ('send', Send()), ('get', Get()), ('manual', Manual()), ('speedDsp', Speed2DSP()), ('fork', Fork()),
+            ('laser', Laser(1000.0, lazy = True)), # 只用到 laser.ts 和 laser.number, 激光点用到时再读取
+            ('err', ErrorLine()), ('war', WarningLine()), ('fatal', FatalLine()), ('notice', NoticeLine()),
+            ('taskstart', TaskStart()), ('taskfinish', TaskFinish()), ('service', Service()),
+            ('memory', Memory())]
+
+def default_parsers():
+    """ 全部解析器, 与 ReadThread 相同 """
+    return [parser for _, parser in parser_table()]
+
+class AlarmEntry:
+    """ 一个报警编号的统计
+    info: 第一次出现时的报警内容
+    count: 出现的次数
+    first, last: 第一次和最后一次出现的时间(微秒)
+    index: 每次出现在事件数组(data[0], data[1])中的下标
+    """
+    __slots__ = ('info', 'count', 'first', 'last', 'index')
+    def __init__(self, info, t):
+        self.info = info
+        self.count = 0
+        self.first = t
+        self.last = t
+        self.index = array('q')
+
+class AlarmCatalog(dict):
+    """ 报警编号目录 {报警编号: AlarmEntry}, 按报警编号第一次出现的顺序排列 """
+    def add(self, num, info, t, index):
+        """ 记录第 index 个事件为报警 num, info 只保留第一次出现时的 """
+        entry = self.get(num)
+        if entry is None:
+            entry = self[num] = AlarmEntry(info, t)
+        entry.count += 1
+        entry.last = t
+        entry.index.append(index)
+    def merge(self, other, offset):
+        """ 合并后面的数据, other 中的下标加上 offset(合并前的事件个数) """
+        for num, src in other.items():
+            entry = self.get(num)
+            if entry is None:
+                entry = self[num] = AlarmEntry(src.info, src.first)
+            entry.count += src.count
+            entry.last = src.last
+            entry.index.extend(i + offset for i in src.index)
+    def nums(self):
+        return list(self.keys())
+    def infos(self):
+        return [e.info for e in self.values()]
+    def counts(self):
+        """ {报警编号: 次数} """
+        return dict((num, e.count) for num, e in self.items())
+
+_DIGITS = re.compile(r'\d+')
+EVENT_READ_BATCH = 1024 # 遍历事件文本时每次读取的个数
+EVENT_MISSING = "[{0} is changed or removed]{1}" # 无法从文件读取时的文本, 参数为文件名和模板
+
+class EventText:
+    """ 事件的文本, 不保存整行, 只记录行在文件中的位置, 用到时再从文件读取
+    file: 所在文件在 files 中的序号, 没有文件时为 -1, 文本保存在 inline 中
+    offset, length: 行首的字节位置和行的字节数(不含换行)
+    template: 模板编号, 模板为去掉时间戳并将数字替换为 # 的文本, 重复的事件共用一个模板
+    files: [文件名, 编码, file_stamp], 跟踪模式下文件被轮转后文件名为 None
+    文件被删除, 修改或者读到的内容与模板不同时, 文本为 EVENT_MISSING 加上模板, 不抛出异常
+    """
+    def __init__(self):
+        self.file = Column('q')
+        self.offset = Column('q')
+        self.length = Column('q')
+        self.template = Column('q')
+        self.files = []
+        self.templates = dict() # 模板 -> 编号
+        self.inline = dict() # 下标 -> 文本, 没有文件位置时使用
+    def __len__(self):
+        return len(self.file)
+    def add(self, line, length, where = None):
+        """ 记录一行事件, length 为行的有效长度, where 为 (文件名, 行首的字节位置)
+        行在这里解码一次, 解码失败时抛出 UnicodeDecodeError, 与原来一样跳过该行
+        """
+        text = decode_text(line[:length])
+        template = _DIGITS.sub('#', text[text.find(']') + 1:])
+        tid = self.templates.get(template)
+        if tid is None:
+            tid = self.templates[template] = len(self.templates)
+        if where is None or where[0] is None:
+            self.inline[len(self.file)] = text
+            self.file.append(-1)
+            self.offset.append(0)
+        else:
+            self.file.append(self.file_id(os.path.abspath(where[0]), _text.encoding))
+            self.offset.append(where[1])
+        self.length.append(length)
+        self.template.append(tid)
+    def file_id(self, file, encoding, stamp = None):
+        """ 文件在 files 中的序号, 新的文件同时记录它的标识 """
+        files = self.files
+        if not files or files[-1][0] != file:
+            for i, f in enumerate(files):
+                if f[0] == file:
+                    return i
+            files.append([file, encoding, stamp or file_stamp(file)])
+        return len(files) - 1
+    def detach(self, file):
+        """ 跟踪的文件被截断或者轮转, 之前记录的事件不再从文件读取 """
+        for f in self.files:
+            if f[0] == file:
+                f[0] = None
+    def extend(self, other):
+        """ 追加另一个 EventText, 重新编号文件和模板 """
+        n = len(self)
+        ids = np.array([self.file_id(f, e, stamp) for f, e, stamp in other.files] + [-1], dtype = np.int64)
+        names = sorted(other.templates, key = other.templates.get)
+        tids = np.array([self.templates.setdefault(t, len(self.templates)) for t in names], dtype = np.int64)
+        self.file.extend(ids[other.file.array()])
+        self.offset.extend(other.offset)
+        self.length.extend(other.length)
+        self.template.extend(tids[other.template.array()])
+        for k, text in other.inline.items():
+            self.inline[k + n] = text
+    def read(self, start, stop):
+        """ 读取第 start 到 stop-1 个事件的文本 """
+        return self.take(range(start, stop))
+    def take(self, index):
+        """ 读取下标在 index 中的事件的文本, 每个文件只打开一次 """
+        file, offset, length, template = self.file.array(), self.offset.array(), self.length.array(), self.template.array()
+        out = []
+        handles = dict()
+        names = None
+        try:
+            for k in index:
+                fid = file[k]
+                if fid < 0:
+                    out.append(self.inline[k])
+                    continue
+                if fid not in handles:
+                    handles[fid] = self.open(fid)
+                f = handles[fid]
+                text = None
+                if f is not None:
+                    f[0].seek(offset[k])
+                    try:
+                        text = f[1].decode(f[0].read(length[k]))
+                    except UnicodeDecodeError:
+                        pass
+                if names is None:
+                    names = self.template_names()
+                name = names[template[k]]
+                # 文件只在末尾追加时标识仍然有效, 用模板再检查一次读到的是否是原来的行
+                if text is None or _DIGITS.sub('#', text[text.find(']') + 1:]) != name:
+                    text = EVENT_MISSING.format(self.files[fid][0] or "rotated file", name)
+                out.append(text)
+        finally:
+            for f in handles.values():
+                if f is not None:
+                    f[0].close()
+        return out
+    def open(self, fid):
+        """ 打开第 fid 个文件, 返回 (文件, TextDecoder), 文件已被删除或修改时返回 None """
+        name, encoding, stamp = self.files[fid]
+        if not stamp_valid(name, stamp):
+            return None
+        try:
+            return open(name, 'rb'), TextDecoder(encoding)
+        except OSError:
+            return None
+    def texts(self):
+        return TextSequence(self, 0, len(self))
+    def template_names(self):
+        """ 按编号排列的模板 """
+        return sorted(self.templates, key = self.templates.get)
+
+class TextSequence:
+    """ 按下标访问事件的文本, 用到时才从文件读取; 切片返回新的 TextSequence, 不读取文件 """
+    def __init__(self, events, start, stop):
+        self.events = events
+        self.start = start
+        self.stop = stop
+    def __len__(self):
+        return self.stop - self.start
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            start, stop, step = k.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return TextSequence(self.events, self.start + start, self.start + max(stop, start))
+        if k < 0:
+            k += len(self)
+        if k < 0 or k >= len(self):
+            raise IndexError("event index out of range")
+        return self.events.read(self.start + k, self.start + k + 1)[0]
+    def __iter__(self):
+        for i in range(self.start, self.stop, EVENT_READ_BATCH):
+            yield from self.events.read(i, min(i + EVENT_READ_BATCH, self.stop))
+
+def merge_alarms(dst, src):
+    """ 合并报警类解析器: 事件按顺序追加, 报警编号目录合并计数和下标 """
+    offset = len(dst.data[0])
+    dst.data[0].extend(src.data[0])
+    dst.data[1].extend(src.data[1])
+    dst.data[2].merge(src.data[2], offset)
+
+def mergeable(parser):
+    """ 解析器的数据能否合并(并行解析需要) """
+    return hasattr(parser, 'merge') or hasattr(parser, 'data')
+
+def merge_parser(dst, src):
+    """ 将 src 的数据按顺序追加到同类解析器 dst 中
+    data, time 中的 Column 和列表逐列追加; 有 merge 方法的解析器调用自己的 merge
+    """
+    if hasattr(dst, 'merge'):
+        dst.merge(src)
+        return
+    for name in ('data', 'time'):
+        if hasattr(src, name):
+            for mine, other in zip(getattr(dst, name), getattr(src, name)):
+                mine.extend(other)
+
+def empty_copy(parser):
+    """ 复制一个不含数据的解析器, 用于发送给子进程 """
+    out = copy.copy(parser)
+    for name in ('data', 'time'):
+        if hasattr(parser, name):
+            setattr(out, name, [Column(c.typecode, c.view) if isinstance(c, Column) else type(c)() for c in getattr(parser, name)])
+    return out
+
+def time_columns(parser):
+    """ 解析器的时间列: 有 time 属性的解析器(如 Memory)为 time 中的每一列, 其他为 data[0] """
+    if isinstance(parser, ProfiledParser):
+        parser = parser.parser
+    if hasattr(parser, 'time'):
+        return list(parser.time)
+    data = getattr(parser, 'data', None)
+    if data and isinstance(data[0], Column):
+        return [data[0]]
+    return []
+
+def time_lengths(parsers):
+    """ 解析器每个时间列的行数, 用于 parsers_bounds 只统计之后追加的数据 """
+    return [len(c) for p in parsers for c in time_columns(p)]
+
+def parsers_bounds(parsers, starts = None):
+    """ 解析器数据的 (最早, 最晚) 时间(微秒), 没有数据时返回 None
+    starts 为 time_lengths 的返回值时只统计之后追加的数据
+    """
+    out = None
+    cols = [c for p in parsers for c in time_columns(p)]
+    for k, c in enumerate(cols):
+        out = merge_bounds(out, c.bounds(starts[k] if starts else 0))
+    return out
+
+def us2time(bounds):
+    """ 微秒的 (最早, 最晚) 转为 datetime64[us], None 返回 (None, None) """
+    if bounds is None:
+        return None, None
+    return np.datetime64(bounds[0], 'us'), np.datetime64(bounds[1], 'us')
+
+def parser_summary(parser):
+    """ 解析器的数据个数和时间范围 {'count': 个数, 'start': 最早时间, 'end': 最晚时间}, 时间为 datetime64[us] """
+    start, end = us2time(parsers_bounds([parser]))
+    return {'count': sum(len(c) for c in time_columns(parser)), 'start': start, 'end': end}
+
+MIN_CHUNK_SIZE = 4 * 1024 * 1024
+FOLLOW_HEAD_SIZE = 64 # 跟踪模式下用文件开头的字节判断文件是否被轮转
+FOLLOW_READ_SIZE = 16 * 1024 * 1024 # 跟踪模式下每次读取的字节数, 第一次跟踪大文件时内存不随文件大小增长
+
+def split_file(filename, chunk_size):
+    """ 用mmap将文件按换行切分为约 chunk_size 字节的区间, 返回 [(start, end)] """
+    size = os.path.getsize(filename)
+    if size <= chunk_size:
+        return [(0, size)]
+    out = []
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = mm.find(b'\n', start + chunk_size)
+            end = size if end < 0 else end + 1
+            out.append((start, end))
+            start = end
+    return out
+
+def mmap_lines(filename, start, end):
+    """ 用mmap逐行读取文件中 [start, end) 的内容, start 需为行首 """
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+        readline = mm.readline
+        pos = start
+        while pos < end:
+            line = readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line
+
+def file_stamp(file):
+    """ 文件的标识 [inode, 大小, 修改时间(ns)], 按字节位置记录行时与文件名一起保存, 文件不存在时返回 None """
+    if file is None:
+        return None
+    try:
+        st = os.stat(file)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+def stamp_valid(file, stamp):
+    """ file 是否还是记录 stamp 时的文件: inode 相同, 之后没有修改或者只在末尾追加了内容
+    文件被删除, 轮转(重新创建), 截断或者重写后返回 False, 此时记录的字节位置不再有效
+    """
+    now = file_stamp(file) if stamp is not None else None
+    if now is None or now[0] != stamp[0]:
+        return False
+    return now[1] > stamp[1] or now[1:] == stamp[1:]
+
+def detach_file(parser, file):
+    """ 文件被截断或者轮转时, 通知按字节位置记录行的解析器不再读取 file(绝对路径)
+    有 detach 方法的解析器调用自己的 detach, 否则处理 data 中的 EventText
+    """
+    detach = getattr(parser, 'detach', None)
+    if detach is not None:
+        detach(file)
+        return
+    for col in getattr(parser, 'data', ()):
+        if isinstance(col, EventText):
+            col.detach(file)
+
+SEEK_LINEAR_SIZE = 64 * 1024 # 二分查找的区间小于该值时逐行查找
+_LINE_STAMP = re.compile(rb'\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{6})\]')
+
+def timeus(t):
+    """ datetime 或者rbk的时间戳字符串转化为1970-01-01起的微秒数 """
+    if isinstance(t, datetime):
+        return (t - EPOCH) // timedelta(microseconds = 1)
+    return rbktimetous(t)
+
+def line_stamp(mm, pos, end):
+    """ 从行首 pos 开始找 [pos, end) 中第一个以时间戳开头的行, 返回 (行首位置, 时间微秒)
+    没有时返回 (end, None)
+    """
+    while pos < end:
+        out = _LINE_STAMP.match(mm, pos)
+        if out:
+            return pos, rbktimetous(out.group(1))
+        pos = mm.find(b'\n', pos, end) + 1
+        if pos == 0:
+            break
+    return end, None
+
+def seek_time(mm, t, lo, hi):
+    """ 在行首 lo 与 hi 之间二分查找第一个时间戳 >= t(微秒) 的行首位置, 要求log的时间戳单调递增
+    从中间位置向后找到下一行的行首, 读取该行的时间戳后缩小区间
+    """
+    while hi - lo > SEEK_LINEAR_SIZE:
+        mid = mm.find(b'\n', (lo + hi) // 2, hi) + 1
+        if mid == 0:
+            break
+        pos, ts = line_stamp(mm, mid, hi)
+        if ts is None:
+            break
+        if ts < t:
+            lo = pos
+        else:
+            hi = pos
+    pos = lo
+    while pos < hi:
+        pos, ts = line_stamp(mm, pos, hi)
+        if ts is None or ts >= t:
+            return pos
+        pos = mm.find(b'\n', pos, hi) + 1
+        if pos == 0:
+            break
+    return hi
+
+def time_range(filename, t_start = None, t_end = None, index = None):
+    """ 返回文件中时间戳在 [t_start, t_end] 内的行的字节区间 (start, end)
+    t_start, t_end 为 datetime 或者rbk的时间戳字符串, None表示不限制
+    index 为文件的稀疏索引(logindex.LogIndex), 用于缩小二分查找的区间
+    """
+    size = os.path.getsize(filename)
+    if size == 0:
+        return 0, 0
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+        def seek(t):
+            lo, hi = index.bounds(t) if index is not None else (0, size)
+            return seek_time(mm, t, lo, hi)
+        start = seek(timeus(t_start)) if t_start is not None else 0
+        end = seek(timeus(t_end) + 1) if t_end is not None else size
+    return start, end
+
+def _parse_worker(args):
+    """ 子进程: 解析文件的 [start, end) 区间, 返回解析器, 行数, 解码失败的行, 编码回退的次数和解析统计
+    profile 为 True 时记录解析统计(ParseStats), 否则统计为 None
+    """
+    filename, start, end, encoding, parsers, profile = args
+    log = ReadLog([filename])
+    log.skipped = []
+    log.encodings[filename] = {'encoding': encoding, 'fallbacks': 0}
+    dispatcher = TagDispatcher(log.profile().wrap(parsers) if profile else parsers)
+    line_num = log.parse_file(filename, dispatcher, 0, start, end)
+    return parsers, line_num, log.skipped, log.encodings[filename]['fallbacks'], log.stats
+
+PROFILE_TOP = 10 # 解析统计中列出的未匹配标签个数
+
+def tag_prefix(key):
+    """ linetags 返回的 (等级, 标签) 转为 "[等级] [标签]" 的字符串 """
+    level, tag = key
+    if level is None:
+        return '(no level)'
+    out = '[' + level.decode('utf-8', 'replace') + ']'
+    if tag is not None:
+        out += ' [' + tag.decode('utf-8', 'replace') + ']'
+    return out
+
+class ParseStats:
+    """ 解析的统计信息, 由 ReadLog.profile() 打开
+    lines, bytes, seconds: 解析的行数, 字节数和总时间; decode_seconds: 其中解码文本的时间
+    parsers: 解析器类名 -> [尝试的行数, 匹配的行数, 累计时间, 处理的字节数]
+    unmatched: 没有解析器匹配的行, (等级, 标签) -> 行数
+    """
+    def __init__(self):
+        self.lines = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.decode_seconds = 0.0
+        self.parsers = OrderedDict()
+        self.unmatched = dict()
+        self.matched = False
+        self._line = None
+        self._text = None
+    def wrap(self, parsers):
+        """ 返回记录统计的解析器代理 """
+        return [ProfiledParser(p, self) for p in parsers]
+    def merge(self, other):
+        """ 合并子进程的统计, 时间为各进程的时间之和 """
+        self.lines += other.lines
+        self.bytes += other.bytes
+        self.seconds += other.seconds
+        self.decode_seconds += other.decode_seconds
+        for name, counts in other.parsers.items():
+            mine = self.counts(name)
+            for i, v in enumerate(counts):
+                mine[i] += v
+        for key, n in other.unmatched.items():
+            self.unmatched[key] = self.unmatched.get(key, 0) + n
+    def counts(self, name):
+        out = self.parsers.get(name)
+        if out is None:
+            out = self.parsers[name] = [0, 0, 0.0, 0]
+        return out
+    def feed(self, lines):
+        """ 逐行返回 lines 并计数, 取下一行时上一行已经解析完, 此时记录上一行是否被匹配 """
+        start = time.perf_counter()
+        try:
+            for line in lines:
+                self.matched = False
+                yield line
+                self.lines += 1
+                self.bytes += len(line)
+                if not self.matched:
+                    key = linetags(line)
+                    self.unmatched[key] = self.unmatched.get(key, 0) + 1
+        finally:
+            self.seconds += time.perf_counter() - start
+    def decode(self, line):
+        """ 解码并计时, 同一行只解码一次 """
+        if line is not self._line:
+            start = time.perf_counter()
+            try:
+                text = decode_text(line)
+            finally:
+                self.decode_seconds += time.perf_counter() - start
+            self._line, self._text = line, text
+        return self._text
+    def as_dict(self, top = PROFILE_TOP):
+        """ 统计结果, 可以直接用 json 保存. top 为列出的未匹配标签个数 """
+        parsers = OrderedDict()
+        for name, (attempts, hits, seconds, size) in self.parsers.items():
+            parsers[name] = {'attempts': attempts, 'hits': hits, 'misses': attempts - hits, 'seconds': seconds,
+                             'bytes': size, 'lines_per_sec': attempts / seconds if seconds > 0 else 0.0}
+        unmatched = sorted(self.unmatched.items(), key = lambda kv: -kv[1])[:top]
+        return {'lines': self.lines, 'bytes': self.bytes, 'seconds': self.seconds,
+                'lines_per_sec': self.lines / self.seconds if self.seconds > 0 else 0.0,
+                'decode_seconds': self.decode_seconds,
+                'parser_seconds': sum(v[2] for v in self.parsers.values()),
+                'unmatched_lines': sum(self.unmatched.values()),
+                'unmatched': [[tag_prefix(key), n] for key, n in unmatched],
+                'parsers': parsers}
+    def report(self, top = PROFILE_TOP):
+        """ 统计结果的文本, 每行一个字符串 """
+        d = self.as_dict(top)
+        out = ['Parsed {0} lines, {1:.1f} MB in {2:.2f} s ({3:.0f} lines/s), decode {4:.2f} s, parsers {5:.2f} s'.format(
+            d['lines'], d['bytes'] / 1e6, d['seconds'], d['lines_per_sec'], d['decode_seconds'], d['parser_seconds'])]
+        for name, p in d['parsers'].items():
+            out.append('  {0}: {1} attempts, {2} hits, {3} misses, {4:.3f} s, {5:.0f} lines/s, {6:.1f} MB'.format(
+                name, p['attempts'], p['hits'], p['misses'], p['seconds'], p['lines_per_sec'], p['bytes'] / 1e6))
+        out.append('Unmatched {0} lines:'.format(d['unmatched_lines']))
+        for prefix, n in d['unmatched']:
+            out.append('  {0} x{1}'.format(prefix, n))
+        return out
+
+class ProfiledParser:
+    """ 记录一个解析器的尝试, 匹配次数和时间
+    解析文本的解析器也按 binary 调用, 由代理解码, 解码时间单独记录
+    """
+    binary = True
+    def __init__(self, parser, stats):
+        self.parser = parser
+        self.stats = stats
+        self.counts = stats.counts(type(parser).__name__)
+        tags = getattr(parser, 'tags', None)
+        if tags is not None:
+            self.tags = tags
+        self.positional = getattr(parser, 'positional', False)
+        self.text = not self.positional and not getattr(parser, 'binary', False)
+    def parse(self, line, where = None):
+        counts = self.counts
+        counts[0] += 1
+        counts[3] += len(line)
+        if self.text:
+            line = self.stats.decode(line)
+        start = time.perf_counter()
+        try:
+            done = self.parser.parse(line, where) if self.positional else self.parser.parse(line)
+        finally:
+            counts[2] += time.perf_counter() - start
+        if done:
+            counts[1] += 1
+            self.stats.matched = True
+        return done
+    def detach(self, file):
+        detach_file(self.parser, file)
+
+class LogRecord(namedtuple('LogRecord', ['t', 'level', 'tag', 'line', 'file', 'offset', 'num'])):
+    """ ReadLog.iter_records 返回的一行log
+    t: 时间(1970-01-01起的微秒数), 行首没有时间戳时为 None
+    level, tag: 等级和第一个标签(str), 没有标签时 tag 为 None
+    line: 原始的字节行; file, offset: 所在的文件和行首的字节位置; num: 行号, 与 parse 跳过的行的行号相同
+    """
+    __slots__ = ()
+    def time(self):
+        """ datetime64[us] 的时间 """
+        return None if self.t is None else np.datetime64(self.t, 'us')
+    def text(self):
+        """ 解码后的行 """
+        return decode_text(self.line)
 
 class ReadLog:
     """ 读取Log """
     def __init__(self, filenames):
         """ 支持传入多个文件名称"""
         self.filenames = filenames
-    def parse(self,*argv):
-        """依据输入的正则进行解析"""
+        self.skipped = None
+        self.encodings = dict()
+        self.tails = dict()
+        self.follow_lines = 0
+        self.rotated = [] # 跟踪模式下被截断或者轮转的文件(绝对路径), 没有传入 follow 的解析器需要调用者用 detach_file 处理
+        self.indexes = dict() # 文件名 -> 稀疏索引(logindex.LogIndex), 按时间窗口解析时使用
+        self.stats = None # 解析的统计信息(ParseStats), 用 profile() 打开
+        self.progress = None # 进度回调 progress(已解析的字节数, 总字节数, 已解析的行数), parse_jobs 每完成一个区间调用一次
+        self.cancelled = False
+        self.bounds = OrderedDict() # 文件名 -> 解析出的数据的 (最早, 最晚) 时间(微秒), 解析时更新
+    def profile(self):
+        """ 打开解析统计, 之后的 parse, follow, parse_parallel, parse_chunked 记录每个解析器的尝试, 匹配次数和时间, 返回 ParseStats
+        多进程解析时合并各子进程的统计, 时间为各进程的时间之和(不是实际经过的时间); 为了统计所有的行, 打开后不使用缓存
+        """
+        if self.stats is None:
+            self.stats = ParseStats()
+        return self.stats
+    def add_bounds(self, file, bounds):
+        """ 记录 file 中解析出的数据的时间范围 """
+        if bounds is not None:
+            self.bounds[file] = merge_bounds(self.bounds.get(file), bounds)
+    def time_bounds(self, file = None):
+        """ 已解析数据的 (最早, 最晚) 时间(datetime64[us]), file 为 None 时为所有文件, 没有数据时返回 (None, None) """
+        if file is not None:
+            return us2time(self.bounds.get(file))
+        out = None
+        for b in self.bounds.values():
+            out = merge_bounds(out, b)
+        return us2time(out)
+    def file_bounds(self):
+        """ 按 filenames 的顺序返回每个文件的 (文件名, 最早时间, 最晚时间), 没有数据的文件时间为 None """
+        return [(f,) + self.time_bounds(f) for f in self.filenames]
+    def cancel(self):
+        """ 停止 parse_parallel, parse_chunked, 可以在其他线程中调用, 当前区间解析完后返回 """
+        self.cancelled = True
+    def parse(self,*argv, t_start = None, t_end = None):
+        """依据输入的正则进行解析
+        t_start, t_end 为需要解析的时间窗口(datetime 或者rbk的时间戳字符串), 用二分查找定位到窗口对应的字节区间,
+        只解析窗口内的行. 此时跳过的行的行号从窗口开始计数
+        """
+        if self.stats is not None:
+            argv = self.stats.wrap(argv)
+        dispatcher = TagDispatcher(argv)
         line_num = 0
         for file in self.filenames:
-            for line in open(file, 'rb'): 
-                try:
-                    line = line.decode('utf-8')
-                except UnicodeDecodeError:
-                    try:
-                        line = line.decode('gbk')
-                    except UnicodeDecodeError:
-                        print("Line ",line_num+1, " is skipped due to decoding failure!", " ", line)
-                        continue
+            start, end = 0, None
+            if t_start is not None or t_end is not None:
+                start, end = time_range(file, t_start, t_end, self.indexes.get(file))
+            line_num = self.parse_file(file, dispatcher, line_num, start, end)
+    def parse_file(self, file, dispatcher, line_num, start = 0, end = None):
+        """ 解析一个文件, line_num 为之前已解析的行数, 返回解析后的行数
+        start, end 为需要解析的字节区间, 默认为整个文件
+        """
+        info = self.encoding(file)
+        _text.reset(info['encoding'])
+        starts = time_lengths(dispatcher.parsers)
+        try:
+            if start == 0 and end is None:
+                with open(file, 'rb') as f:
+                    return self.parse_lines(f, dispatcher, line_num, file)
+            if end is None:
+                end = os.path.getsize(file)
+            if end <= start:
+                return line_num
+            return self.parse_lines(mmap_lines(file, start, end), dispatcher, line_num, file, start)
+        finally:
+            info['fallbacks'] += _text.fallbacks
+            self.add_bounds(file, parsers_bounds(dispatcher.parsers, starts))
+    def iter_records(self, tags = None, t_start = None, t_end = None):
+        """ 逐行返回 LogRecord, 不保存解析结果, 内存占用与文件大小无关
+        tags: 需要的等级或标签(与解析器的 tags 属性相同), None 为所有行
+        t_start, t_end: 时间窗口, 与 parse 相同
+        可以与 filter, map 等组合, 再用 feed 交给解析器, 例如
+            log.feed(r for r in log.iter_records(tags = ("error",)) if b"52600" in r.line), err)
+        """
+        want = None if tags is None else set(t.encode('utf-8') for t in tags)
+        names = dict() # bytes -> str 的缓存
+        line_num = 0
+        for file in self.filenames:
+            start, end = 0, None
+            if t_start is not None or t_end is not None:
+                start, end = time_range(file, t_start, t_end, self.indexes.get(file))
+            if end is None:
+                end = os.path.getsize(file)
+            if end <= start:
+                continue
+            info = self.encoding(file)
+            pos = start
+            for line in mmap_lines(file, start, end):
                 line_num += 1
-                for data in argv:
-                    if data.parse(line):
+                level, tag = linetags(line)
+                if want is None or level in want or tag in want:
+                    # 调用者在两次返回之间可能解析了其他文件, 返回前确认文本字段的编码
+                    if _text.encoding != info['encoding']:
+                        _text.reset(info['encoding'])
+                    out = _LINE_STAMP.match(line)
+                    yield LogRecord(rbktimetous(out.group(1)) if out else None,
+                                    level if level is None else names.setdefault(level, level.decode('utf-8', 'replace')),
+                                    tag if tag is None else names.setdefault(tag, tag.decode('utf-8', 'replace')),
+                                    line, file, pos, line_num)
+                pos += len(line)
+    def feed(self, records, *argv):
+        """ 将 iter_records 返回的行交给解析器, 解析器作为数据流的终点
+        feed(iter_records(), *argv) 与 parse(*argv) 的结果相同; 解码失败的行按 parse 的方式跳过
+        """
+        dispatcher = TagDispatcher(argv)
+        table = dict() # (level, tag) -> dispatcher.candidates 的结果
+        for r in records:
+            parsers = table.get((r.level, r.tag))
+            if parsers is None:
+                parsers = table[(r.level, r.tag)] = dispatcher.candidates(*(None if k is None else k.encode('utf-8') for k in (r.level, r.tag)))
+            parsers, text, positional = parsers
+            try:
+                if positional:
+                    self.parse_at(r.line, parsers, (r.file, r.offset))
+                elif text:
+                    self.parse_text(r.line, parsers)
+                else:
+                    for data in parsers:
+                        if data.parse(r.line):
+                            break
+            except UnicodeDecodeError:
+                self.skip(r.num, r.line)
+    def follow(self, *argv):
+        """ 跟踪模式: 只解析每个文件上次调用之后追加的完整行, 返回新解析的行数
+        第一次调用时从头解析. 文件末尾不完整的行留到下一次调用,
+        文件被截断或者轮转(重新创建)时从头解析新的文件, 已解析的数据保留
+        """
+        if self.stats is not None:
+            argv = self.stats.wrap(argv)
+        dispatcher = TagDispatcher(argv)
+        num = self.follow_lines
+        for file in self.filenames:
+            self.follow_file(file, dispatcher)
+        return self.follow_lines - num
+    def follow_file(self, file, dispatcher):
+        """ 解析 file 追加的内容, self.tails[file] 记录已读取的字节数, 不完整的最后一行和文件的标识 """
+        try:
+            f = open(file, 'rb')
+        except OSError:
+            # 轮转时文件可能暂时不存在
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            head = f.read(FOLLOW_HEAD_SIZE)
+            tail = self.tails.get(file)
+            if tail is not None and (st.st_ino != tail['ino'] or st.st_size < tail['offset']
+                                     or head[:len(tail['head'])] != tail['head']):
+                print("File", file, "is rotated or truncated, read from the beginning")
+                self.encodings.pop(file, None)
+                self.rotated.append(os.path.abspath(file))
+                for p in dispatcher.parsers:
+                    detach_file(p, os.path.abspath(file))
+                tail = None
+            if tail is None:
+                tail = {'offset': 0, 'partial': b'', 'ino': st.st_ino, 'head': b''}
+                self.tails[file] = tail
+            if st.st_size == tail['offset']:
+                return
+            if len(tail['head']) < FOLLOW_HEAD_SIZE:
+                tail['head'] = head
+            info = self.encoding(file)
+            _text.reset(info['encoding'])
+            starts = time_lengths(dispatcher.parsers)
+            f.seek(tail['offset'])
+            try:
+                while tail['offset'] < st.st_size:
+                    raw = f.read(min(FOLLOW_READ_SIZE, st.st_size - tail['offset']))
+                    if not raw:
                         break
+                    self.follow_chunk(file, dispatcher, tail, raw)
+            finally:
+                info['fallbacks'] += _text.fallbacks
+                self.add_bounds(file, parsers_bounds(dispatcher.parsers, starts))
+    def follow_chunk(self, file, dispatcher, tail, raw):
+        """ 解析读取的一段 raw: 与上一段不完整的行拼接, 最后不完整的行留到下一段 """
+        pos = tail['offset'] - len(tail['partial'])
+        tail['offset'] += len(raw)
+        raw = tail['partial'] + raw
+        end = raw.rfind(b'\n') + 1
+        tail['partial'] = raw[end:]
+        if end > 0:
+            self.follow_lines = self.parse_lines(io.BytesIO(raw[:end]), dispatcher, self.follow_lines, file, pos)
+    def encoding(self, file):
+        """ 文件的编码信息 {'encoding': 检测到的编码, 'fallbacks': 回退到其他编码的文本字段个数} """
+        info = self.encodings.get(file)
+        if info is None:
+            info = {'encoding': detect_encoding(file), 'fallbacks': 0}
+            self.encodings[file] = info
+        return info
+    def parse_lines(self, lines, dispatcher, line_num, file = None, pos = 0):
+        """ 解析原始的字节行, 返回解析后的行数
+        只有需要文本的字段才解码, 解码失败的行跳过. file, pos 为第一行所在的文件和字节位置
+        """
+        table = dispatcher.table
+        if self.stats is not None:
+            lines = self.stats.feed(lines)
+        for line in lines:
+            line_num += 1
+            key = linetags(line)
+            parsers = table.get(key)
+            if parsers is None:
+                parsers = dispatcher.candidates(*key)
+            parsers, text, positional = parsers
+            try:
+                if positional:
+                    self.parse_at(line, parsers, (file, pos))
+                elif text:
+                    self.parse_text(line, parsers)
+                else:
+                    for data in parsers:
+                        if data.parse(line):
+                            break
+            except UnicodeDecodeError:
+                self.skip(line_num, line)
+            pos += len(line)
+        return line_num
+    def parse_text(self, line, parsers):
+        """ 有不支持 bytes 的解析器时, 将行解码后交给它们 """
+        text = decode_text(line)
+        for data in parsers:
+            if data.parse(line if getattr(data, 'binary', False) else text):
+                break
+    def parse_at(self, line, parsers, where):
+        """ 有需要行位置的解析器时, 将 where = (文件名, 行首的字节位置) 交给它们 """
+        text = None
+        for data in parsers:
+            if getattr(data, 'positional', False):
+                done = data.parse(line, where)
+            elif getattr(data, 'binary', False):
+                done = data.parse(line)
+            else:
+                if text is None:
+                    text = decode_text(line)
+                done = data.parse(text)
+            if done:
+                break
+    def skip(self, line_num, line):
+        """ 解码失败的行 """
+        if self.skipped is None:
+            print("Line ",line_num, " is skipped due to decoding failure!", " ", line)
+        else:
+            self.skipped.append((line_num, line))
+    def parse_parallel(self, *argv, workers = None, cache = None):
+        """ 多进程解析, 每个文件由一个子进程解析, 结果按文件顺序合并到 argv 中的解析器
+        结果与 parse 相同. workers 为进程数, 默认为cpu个数
+        cache 为 logcache.ParseCache, 命中的文件直接读取缓存, 新解析的文件写入缓存
+        """
+        self.parse_jobs([(f, 0, None) for f in self.filenames], argv, workers, cache)
+    def parse_chunked(self, *argv, workers = None, chunk_size = None, cache = None):
+        """ 多进程解析单个大文件, 用mmap将文件按换行切分为多个字节区间, 每个区间由一个子进程解析,
+        结果按区间顺序合并到 argv 中的解析器, 与 parse 相同.
+        chunk_size 为每个区间的字节数, 默认将每个文件平分给 workers 个进程
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        jobs = []
+        for f in self.filenames:
+            size = chunk_size
+            if size is None:
+                size = max(os.path.getsize(f) // workers + 1, MIN_CHUNK_SIZE)
+            jobs.extend((f, start, end) for start, end in split_file(f, size))
+        self.parse_jobs(jobs, argv, workers, cache)
+    def parse_jobs(self, jobs, argv, workers = None, cache = None):
+        """ 解析 jobs 中的 (文件名, start, end) 区间, 同一文件的区间需相邻且从0开始.
+        每个区间的结果按顺序合并到 argv 中的解析器, 使用缓存时同时合并到该文件自己的解析器副本, 文件解析完后写入缓存.
+        每个区间完成后调用 self.progress; self.cancelled 为 True 时停止, argv 中只有已完成的部分
+        打开解析统计时不使用缓存, 子进程的统计合并到 self.stats
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        profile = self.stats is not None
+        if profile:
+            cache = None
+        if not all(mergeable(p) for p in argv) or (workers <= 1 and cache is None and self.progress is None):
+            self.parse(*argv)
+            return
+        # 按文件分组, 每个文件从 start == 0 的区间开始
+        groups = []
+        for f, start, end in jobs:
+            if start == 0 or not groups:
+                groups.append((f, []))
+            groups[-1][1].append((f, start, end))
+        cached = [cache.load(f, argv) if cache is not None else None for f, _ in groups]
+        pending = []
+        for (f, group), hit in zip(groups, cached):
+            if hit is None:
+                encoding = self.encoding(f)['encoding']
+                pending.extend((f, start, end, encoding, [empty_copy(p) for p in argv], profile) for f, start, end in group)
+        workers = min(workers, len(pending))
+        pool = multiprocessing.Pool(workers) if workers > 1 else None
+        sizes = [sum((end if end is not None else os.path.getsize(f)) - start for f, start, end in group) for f, group in groups]
+        total = sum(sizes)
+        try:
+            results = pool.imap(_parse_worker, pending) if pool else map(_parse_worker, pending)
+            line_num = 0
+            done = 0
+            for (f, group), hit, size in zip(groups, cached, sizes):
+                if self.cancelled:
+                    return
+                if hit is not None:
+                    parsers, n, info, skipped = hit
+                    self.encodings[f] = info
+                    for num, line in skipped:
+                        self.skip(line_num + num, line)
+                    for dst, src in zip(argv, parsers):
+                        merge_parser(dst, src)
+                    self.add_bounds(f, parsers_bounds(parsers))
+                    line_num += n
+                    done += size
+                    if self.progress is not None:
+                        self.progress(done, total, line_num)
+                    continue
+                # 每个区间解析完直接合并到 argv, 解析过程中可以读取已完成的部分; 写缓存时另外合并一份该文件的结果
+                parsers = [empty_copy(p) for p in argv] if cache is not None else None
+                n = 0
+                skipped = []
+                for f, start, end in group:
+                    if self.cancelled:
+                        return
+                    out, k, part_skipped, fallbacks, stats = next(results)
+                    if stats is not None:
+                        self.stats.merge(stats)
+                    for num, line in part_skipped:
+                        skipped.append((n + num, line))
+                        self.skip(line_num + n + num, line)
+                    for dst, src in zip(argv, out):
+                        merge_parser(dst, src)
+                    self.add_bounds(f, parsers_bounds(out))
+                    if parsers is not None:
+                        for dst, src in zip(parsers, out):
+                            merge_parser(dst, src)
+                    self.encodings[f]['fallbacks'] += fallbacks
+                    n += k
+                    done += (end if end is not None else os.path.getsize(f)) - start
+                    if self.progress is not None:
+                        self.progress(done, total, line_num + n)
+                if cache is not None:
+                    cache.save(f, parsers, n, self.encodings[f], skipped)
+                line_num += n
+        finally:
+            if pool:
+                pool.terminate()
 
 class MCLoc:
     """  融合后的激光定位
@@ -61,14 +1385,16 @@ class MCLoc:
     data[5]: cur_t
     data[6]: ts
     """
+    tags = ("Location",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile("\[(.*?)\].*\[Location\]\[(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\|0\|0\]")
-        self.data = [[] for _ in range(7)]
+        self.regex = re.compile(rb"\[(.*?)\].*\[Location\]\[(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\|0\|0\]")
+        self.data = columns(7)
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
+            self.data[0].append(rbktimetous(datas[0]))
             self.data[1].append(float(datas[1])/1000.0)
             self.data[2].append(float(datas[2])/1000.0)
             self.data[3].append(float(datas[3]))
@@ -78,19 +1404,19 @@ class MCLoc:
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def x(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def y(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def theta(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def confidence(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
     def cur_t(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.data[5].array(), self.data[0].array())
     def ts(self):
-        return self.data[6], self.data[0]
+        return TimeSeries(self.data[6].array(), self.data[0].array())
 
 class IMU:
     """  陀螺仪数据
@@ -108,16 +1434,20 @@ class IMU:
     data[11]: offx LSB
     data[12]: offy LSB
     data[13]: offz LSB
+    每一列都与 t 等长, 缺少的字段为 nan (11个字段的行没有 pitch, roll; 字段数不对的行全部为 nan),
+    因此 imu.gx + imu.offx 等按行计算, 不会错位或者插值
     """
+    tags = ("IMU",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile("\[(.*?)\].*\[IMU\]\[(.*?)\]")
-        self.data = [[] for _ in range(14)]
+        self.regex = re.compile(rb"\[(.*?)\].*\[IMU\]\[(.*?)\]")
+        self.data = columns(14)
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            values = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            values = datas[1].split(b'|')
             if len(values) == 11:
                 self.data[1].append(float(values[0])/math.pi * 180.0)
                 self.data[4].append(float(values[1]))
@@ -146,42 +1476,43 @@ class IMU:
                 self.data[13].append(float(values[12]))
             else:
                 print("Error in IMU parse: ", datas)
+            fill_missing(self.data)
             return True
         return False
 
-    def old2newGyro(self):
-        self.data[8] = [v/math.pi*180.0*16.4 for v in self.data[8]]
-        self.data[9] = [v/math.pi*180.0*16.4 for v in self.data[9]]
-        self.data[10] = [v/math.pi*180.0*16.4 for v in self.data[10]]
+    def old2newGyro(self, start = 0):
+        self.data[8].scale(1.0/math.pi*180.0*16.4, start)
+        self.data[9].scale(1.0/math.pi*180.0*16.4, start)
+        self.data[10].scale(1.0/math.pi*180.0*16.4, start)
 
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def yaw(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def pitch(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def roll(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def ts(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
     def ax(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.data[5].array(), self.data[0].array())
     def ay(self):
-        return self.data[6], self.data[0]
+        return TimeSeries(self.data[6].array(), self.data[0].array())
     def az(self):
-        return self.data[7], self.data[0]
+        return TimeSeries(self.data[7].array(), self.data[0].array())
     def gx(self):
-        return self.data[8], self.data[0]
+        return TimeSeries(self.data[8].array(), self.data[0].array())
     def gy(self):
-        return self.data[9], self.data[0]
+        return TimeSeries(self.data[9].array(), self.data[0].array())
     def gz(self):
-        return self.data[10], self.data[0]
+        return TimeSeries(self.data[10].array(), self.data[0].array())
     def offx(self):
-        return self.data[11], self.data[0]
+        return TimeSeries(self.data[11].array(), self.data[0].array())
     def offy(self):
-        return self.data[12], self.data[0]
+        return TimeSeries(self.data[12].array(), self.data[0].array())
     def offz(self):
-        return self.data[13], self.data[0]
+        return TimeSeries(self.data[13].array(), self.data[0].array())
 
 class Odometer:
     """  里程数据
@@ -200,23 +1531,26 @@ class Odometer:
     data[12]: encoder1
     data[13]: encoder2
     data[14]: encoder3
+    缺少的字段为 nan (例如没有 encoder 的行), 每一列都与 t 等长
     """
+    tags = ("Odometer",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile("\[(.*?)\].*\[Odometer\]\[(.*?)\]")
-        self.data = [[] for _ in range(15)]
+        self.regex = re.compile(rb"\[(.*?)\].*\[Odometer\]\[(.*?)\]")
+        self.data = columns(15, flags = (6,))
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            values = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            values = datas[1].split(b'|')
             if len(values) >= 10:
                 self.data[1].append(float(values[0]))
                 self.data[2].append(float(values[1]))
                 self.data[3].append(float(values[2]))
                 self.data[4].append(float(values[3]))
                 self.data[5].append(float(values[4])/math.pi * 180.0)
-                self.data[6].append(float(values[5] == "true"))
+                self.data[6].append(float(values[5] == b"true"))
                 self.data[7].append(float(values[6]))
                 self.data[8].append(float(values[7]))
                 self.data[9].append(float(values[8]))
@@ -233,40 +1567,41 @@ class Odometer:
                                     print("Error in Odometer parse: ", datas)
             else:
                 print("Error in Odometer parse: ", datas)
+            fill_missing(self.data)
             return True
         return False
 
 
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def cycle(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def ts(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def x(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def y(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
     def theta(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.data[5].array(), self.data[0].array())
     def stop(self):
-        return self.data[6], self.data[0]
+        return TimeSeries(self.data[6].array(), self.data[0].array())
     def vx(self):
-        return self.data[7], self.data[0]
+        return TimeSeries(self.data[7].array(), self.data[0].array())
     def vy(self):
-        return self.data[8], self.data[0]
+        return TimeSeries(self.data[8].array(), self.data[0].array())
     def vw(self):
-        return self.data[9], self.data[0]
+        return TimeSeries(self.data[9].array(), self.data[0].array())
     def steer_angle(self):
-        return self.data[10], self.data[0]
+        return TimeSeries(self.data[10].array(), self.data[0].array())
     def encode0(self):
-        return self.data[11], self.data[0]
+        return TimeSeries(self.data[11].array(), self.data[0].array())
     def encode1(self):
-        return self.data[12], self.data[0]
+        return TimeSeries(self.data[12].array(), self.data[0].array())
     def encode2(self):
-        return self.data[13], self.data[0]
+        return TimeSeries(self.data[13].array(), self.data[0].array())
     def encode3(self):
-        return self.data[14], self.data[0]
+        return TimeSeries(self.data[14].array(), self.data[0].array())
 
 class LaserOdometer:
     """ 激光里程数据 
@@ -276,15 +1611,17 @@ class LaserOdometer:
     data[3]: y
     data[4]: angle
     """
+    tags = ("LaserOdometer",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].*\[LaserOdometer\]\[(.*?)\]')
-        self.data = [[] for _ in range(5)]
+        self.regex = re.compile(rb'\[(.*?)\].*\[LaserOdometer\]\[(.*?)\]')
+        self.data = columns(5)
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            values = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            values = datas[1].split(b'|')
             if len(values) == 4:
                 self.data[1].append(float(values[0]))
                 self.data[2].append(float(values[1]))
@@ -292,18 +1629,19 @@ class LaserOdometer:
                 self.data[4].append(float(values[3])/math.pi*180.0)
             else:
                 print("Error in LaserOdometer parse: ", datas)
+            fill_missing(self.data)
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def ts(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def x(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def y(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def angle(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
 
 class Battery:
     """  电池数据
@@ -315,40 +1653,43 @@ class Battery:
     data[5]: temperature
     data[6]: cycle
     """
+    tags = ("Battery",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].*\[Battery\]\[(.*?)\]')
-        self.data = [[] for _ in range(7)]
+        self.regex = re.compile(rb'\[(.*?)\].*\[Battery\]\[(.*?)\]')
+        self.data = columns(7, flags = (4,))
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            values = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            values = datas[1].split(b'|')
             if len(values) == 6:
                 self.data[1].append(float(values[0]))
                 self.data[2].append(float(values[1]))
                 self.data[3].append(float(values[2]))
-                self.data[4].append(float(values[3] == "true"))
+                self.data[4].append(float(values[3] == b"true"))
                 self.data[5].append(float(values[4]))
                 self.data[6].append(float(values[5]))
             else:
                 print("Error in Battery parse: ", datas)
+            fill_missing(self.data)
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def percentage(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def current(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def voltage(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def ischarging(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
     def temperature(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.data[5].array(), self.data[0].array())
     def cycle(self):
-        return self.data[6], self.data[0]
+        return TimeSeries(self.data[6].array(), self.data[0].array())
 
 class Controller:
     """  控制器数据
@@ -363,50 +1704,53 @@ class Controller:
     data[8]: autocharge
     data[9]: electric
     """
+    tags = ("Controller",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].*\[Controller\]\[(.*?)\]')
-        self.data = [[] for _ in range(10)]
+        self.regex = re.compile(rb'\[(.*?)\].*\[Controller\]\[(.*?)\]')
+        self.data = columns(10, flags = (4, 5, 6, 7, 8, 9))
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            values = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            values = datas[1].split(b'|')
             if len(values) == 9:
                 self.data[1].append(float(values[0]))
                 self.data[2].append(float(values[1]))
                 self.data[3].append(float(values[2]))
-                self.data[4].append(float(values[3] == "true"))
-                self.data[5].append(float(values[4] == "true"))
-                self.data[6].append(float(values[5] == "true"))
-                self.data[7].append(float(values[6] == "true"))
-                self.data[8].append(float(values[7] == "true"))
-                self.data[9].append(float(values[8] == "true"))
+                self.data[4].append(float(values[3] == b"true"))
+                self.data[5].append(float(values[4] == b"true"))
+                self.data[6].append(float(values[5] == b"true"))
+                self.data[7].append(float(values[6] == b"true"))
+                self.data[8].append(float(values[7] == b"true"))
+                self.data[9].append(float(values[8] == b"true"))
             else:
                 print("Error in Controller parse: ", datas)
+            fill_missing(self.data)
             return True
         return False
 
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def temp(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def humi(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def voltage(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def emc(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
     def brake(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.data[5].array(), self.data[0].array())
     def driveremc(self):
-        return self.data[6], self.data[0]
+        return TimeSeries(self.data[6].array(), self.data[0].array())
     def manualcharge(self):
-        return self.data[7], self.data[0]
+        return TimeSeries(self.data[7].array(), self.data[0].array())
     def autocharge(self):
-        return self.data[8], self.data[0]
+        return TimeSeries(self.data[8].array(), self.data[0].array())
     def electric(self):
-        return self.data[9], self.data[0]
+        return TimeSeries(self.data[9].array(), self.data[0].array())
 
 class StopPoints:
     """ 阻挡障碍物信息 
@@ -417,15 +1761,17 @@ class StopPoints:
     data[4]: id
     data[5]: dist
     """
+    tags = ("StopPoints",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].*\[StopPoints\]\[(.*?)\]')
-        self.data = [[] for _ in range(10)]
+        self.regex = re.compile(rb'\[(.*?)\].*\[StopPoints\]\[(.*?)\]')
+        self.data = columns(6)
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            values = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            values = datas[1].split(b'|')
             if len(values) == 5:
                 self.data[1].append(float(values[0]))
                 self.data[2].append(float(values[1]))
@@ -434,21 +1780,22 @@ class StopPoints:
                 self.data[5].append(float(values[4]))
             else:
                 print("Error in StopPoints parse: ", datas)
+            fill_missing(self.data)
             return True
         return False
 
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def x(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def y(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def type(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def id(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
     def dist(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.data[5].array(), self.data[0].array())
 
 class SlowDownPoints:
     """ 减速障碍物信息 
@@ -459,15 +1806,17 @@ class SlowDownPoints:
     data[4]: id
     data[5]: dist
     """
+    tags = ("SlowDownPoints",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].*\[SlowDownPoints\]\[(.*?)\]')
-        self.data = [[] for _ in range(10)]
+        self.regex = re.compile(rb'\[(.*?)\].*\[SlowDownPoints\]\[(.*?)\]')
+        self.data = columns(6)
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            values = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            values = datas[1].split(b'|')
             if len(values) == 5:
                 self.data[1].append(float(values[0]))
                 self.data[2].append(float(values[1]))
@@ -476,21 +1825,22 @@ class SlowDownPoints:
                 self.data[5].append(float(values[4]))
             else:
                 print("Error in StopPoints parse: ", datas)
+            fill_missing(self.data)
             return True
         return False
 
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def x(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def y(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def type(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def id(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
     def dist(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.data[5].array(), self.data[0].array())
 
 class SensorFuser:
     """ 传感器融合信息
@@ -498,29 +1848,32 @@ class SensorFuser:
     data[1]: localnum  
     data[2]: globalnum 
     """
+    tags = ("SensorFuserPoints",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].*\[SensorFuserPoints\]\[(.*?)\]')
-        self.data = [[] for _ in range(10)]
+        self.regex = re.compile(rb'\[(.*?)\].*\[SensorFuserPoints\]\[(.*?)\]')
+        self.data = columns(3)
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            values = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            values = datas[1].split(b'|')
             if len(values) == 2:
                 self.data[1].append(float(values[0]))
                 self.data[2].append(float(values[1]))
             else:
                 print("Error in SensorFuser parse: ", datas)
+            fill_missing(self.data)
             return True
         return False
 
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def localnum(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def globalnum(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
 
 class Send:
     """  发送的速度数据
@@ -532,14 +1885,16 @@ class Send:
     data[5]: max_vx m/s
     data[6]: max_vw rad/s
     """
+    tags = ("Send",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].* \[Send\]\[(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\]')
-        self.data = [[] for _ in range(7)]
+        self.regex = re.compile(rb'\[(.*?)\].* \[Send\]\[(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\]')
+        self.data = columns(7)
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
+            self.data[0].append(rbktimetous(datas[0]))
             self.data[1].append(float(datas[1]))
             self.data[2].append(float(datas[2]))
             self.data[3].append(float(datas[3]))
@@ -549,19 +1904,19 @@ class Send:
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def vx(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def vy(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def vw(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def steer_angle(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
     def max_vx(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.data[5].array(), self.data[0].array())
     def max_vw(self):
-        return self.data[6], self.data[0]
+        return TimeSeries(self.data[6].array(), self.data[0].array())
 
 class Get:
     """  接收的速度数据
@@ -573,14 +1928,16 @@ class Get:
     data[5]: max_vx m/s
     data[6]: max_vw rad/s
     """
+    tags = ("Get",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].* \[Get\]\[(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\]')
-        self.data = [[] for _ in range(7)]
+        self.regex = re.compile(rb'\[(.*?)\].* \[Get\]\[(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\|(.*?)\]')
+        self.data = columns(7)
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
+            self.data[0].append(rbktimetous(datas[0]))
             self.data[1].append(float(datas[1]))
             self.data[2].append(float(datas[2]))
             self.data[3].append(float(datas[3]))
@@ -590,19 +1947,19 @@ class Get:
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def vx(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def vy(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def vw(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def steer_angle(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
     def max_vx(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.data[5].array(), self.data[0].array())
     def max_vw(self):
-        return self.data[6], self.data[0]
+        return TimeSeries(self.data[6].array(), self.data[0].array())
 
 class Speed2DSP:
     """  手动的速度数据
@@ -613,15 +1970,17 @@ class Speed2DSP:
     data[4]: steer_angle rad
     data[5]: spin_speed rad
     """
+    tags = ("Speed2DSP",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].* \[Speed2DSP\]\[(.*?)\]')
-        self.data = [[] for _ in range(6)]
+        self.regex = re.compile(rb'\[(.*?)\].* \[Speed2DSP\]\[(.*?)\]')
+        self.data = columns(6)
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            values = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            values = datas[1].split(b'|')
             if len(values) == 5:
                 self.data[1].append(float(values[0]))
                 self.data[2].append(float(values[1]))
@@ -636,20 +1995,21 @@ class Speed2DSP:
                 self.data[5].append(0.0)
             else:
                 print("Error in Speed2DSP parse: ", datas)
+            fill_missing(self.data)
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def vx(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def vy(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def vw(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def steer_angle(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
     def spin_speed(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.data[5].array(), self.data[0].array())
 
 
 class Manual:
@@ -660,14 +2020,16 @@ class Manual:
     data[3]: vw rad/s
     data[4]: steer_angle rad
     """
+    tags = ("Manual",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].* \[Manual\]\[(.*?)\|(.*?)\|(.*?)\|(.*?)\]')
-        self.data = [[] for _ in range(5)]
+        self.regex = re.compile(rb'\[(.*?)\].* \[Manual\]\[(.*?)\|(.*?)\|(.*?)\|(.*?)\]')
+        self.data = columns(5)
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
+            self.data[0].append(rbktimetous(datas[0]))
             self.data[1].append(float(datas[1]))
             self.data[2].append(float(datas[2]))
             self.data[3].append(float(datas[3]))
@@ -675,15 +2037,15 @@ class Manual:
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def vx(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def vy(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
     def vw(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.data[3].array(), self.data[0].array())
     def steer_angle(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.data[4].array(), self.data[0].array())
 
 class Fork:
     """  货叉的数据
@@ -691,289 +2053,509 @@ class Fork:
     data[1]: height 货叉当前高度
     data[2]: height_in_place 货叉是否到位
     """ 
+    tags = ("Fork",)
+    binary = True
     def __init__(self):
-        self.regex = re.compile('\[(.*?)\].* \[Fork\]\[(.*?)\]')
-        self.data = [[] for _ in range(3)]
+        self.regex = re.compile(rb'\[(.*?)\].* \[Fork\]\[(.*?)\]')
+        self.data = columns(3, flags = (2,))
     def parse(self, line):
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            values = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            values = datas[1].split(b'|')
             if len(values) == 2:
                 self.data[1].append(float(values[0]))
-                self.data[2].append(float(values[1]== "true"))
+                self.data[2].append(float(values[1]== b"true"))
             else:
                 print("Error in Fork parse: ", datas)
+            fill_missing(self.data)
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def height(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def height_in_place(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.data[2].array(), self.data[0].array())
+
+class ScanSequence:
+    """ 按帧访问激光数据, seq[i] 返回 func(第i帧的角度, 第i帧的距离), seq[i:j] 返回第 i 到 j-1 帧的 ScanSequence
+    batch(start, stop) 返回第 start 到 stop-1 帧所有点的 (角度, 距离), 用到时才计算, 不保存计算结果
+    """
+    def __init__(self, n, batch, func):
+        self.n = n
+        self.batch = batch
+        self.func = func
+    def __len__(self):
+        return self.n
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            start, stop, step = k.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            # 连续的切片返回新的 ScanSequence, 同样用到时才计算
+            return ScanSequence(max(stop - start, 0), lambda i, j: self.batch(start + i, start + j), self.func)
+        if k < 0:
+            k += len(self)
+        if k < 0 or k >= len(self):
+            raise IndexError("scan index out of range")
+        return self.func(*self.batch(k, k + 1))
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+    def values(self, start = 0, stop = None):
+        """ 第 start 到 stop-1 帧所有点的 func 结果连接成的一个数组 """
+        if stop is None:
+            stop = len(self)
+        return self.func(*self.batch(start, stop))
+
+LASER_LRU_SIZE = 64
 
 class Laser:
     """  激光雷达的数据
     data[0]: t
     data[1]: ts 激光点的时间戳
-    data[2]: angle rad 
-    data[3]: dist m
-    data[4]: x m
-    data[5]: y m
-    data[6]: number
+    data[2]: angle rad, 所有帧的激光点连接在一起, float32
+    data[3]: dist m, 所有帧的激光点连接在一起, float32
+    data[4]: number 每一帧的激光点数, 懒加载时为过滤前的点数
+    懒加载(lazy)时 data[2], data[3] 为空, 只记录每一帧在文件中的位置, 用到时再读取解析:
+    data[5]: 所在文件在 data[8] 中的序号
+    data[6]: 行首在文件中的字节位置
+    data[7]: 行的字节数
+    data[8]: [文件名, file_stamp], 文件被修改或删除后对应的帧读取为空, 跟踪模式下文件被轮转后文件名为 None
     """
-    def __init__(self, max_dist):
-        """ max_dist 为激光点的最远距离，大于此距离激光点无效"""
-        self.regex = re.compile('\[(.*?)\].* \[Laser\]\[(.*?)\]')
-        self.data = [[] for _ in range(7)]
+    tags = ("Laser",)
+    binary = True
+    def __init__(self, max_dist, lazy = False):
+        """ max_dist 为激光点的最远距离，大于此距离激光点无效
+        lazy 为 True 时解析时只记录每一帧的时间, 过滤前的点数和位置, 不转换激光点.
+        number() 为max_dist过滤后的点数, 与不懒加载时相同, 第一次用到时读取各帧计算
+        """
+        self.regex = re.compile(rb'\[(.*?)\].* \[Laser\]\[(.*?)\]')
+        self.data = [time_column(), Column(), Column('f'), Column('f'), Column('q'), Column('q'), Column('q'), Column('q'), []]
         self.max_dist = max_dist
-    def parse(self, line):
+        self.lazy = lazy
+        self.positional = lazy
+        self.recent = OrderedDict() # 懒加载时最近读取的帧 {帧号: (角度, 距离)}
+        self.missing = set() # 懒加载时无法读取的文件, 只提示一次
+        self.counts = None # 懒加载时 (data[4], 已计算的过滤后的点数), data[4] 被替换(如 empty_copy)后重新计算
+    def parse(self, line, where = None):
+        if self.lazy:
+            return self.parse_position(line, where)
         out = self.regex.match(line)
         if out:
             datas = out.groups()
-            self.data[0].append(rbktimetodate(datas[0]))
-            tmp_datas = datas[1].split('|')
+            self.data[0].append(rbktimetous(datas[0]))
+            tmp_datas = datas[1].split(b'|')
             self.data[1].append(float(tmp_datas[0]))
-            #min_angle = float(tmp_datas[1])
-            #max_angle = float(tmp_datas[2])
-            #step_angle = float(tmp_datas[3])
-            #data_number = int((max_angle - min_angle) / step_angle)
-            angle = [float(tmp)/180.0*math.pi for tmp in tmp_datas[4::2]]
-            dist = [float(tmp) for tmp in tmp_datas[5::2]]
-            tmp_a, tmp_d = [], []
-            for a, d in zip(angle,dist):
-                if d < self.max_dist:
-                    tmp_a.append(a)
-                    tmp_d.append(d)
-            angle = tmp_a 
-            dist = tmp_d
-            self.data[2].append(angle)
-            self.data[3].append(dist)
-            x , y = polar2xy(angle, dist)
-            self.data[4].append(x)
-            self.data[5].append(y)
-            self.data[6].append(len(x))
+            angle, dist = self.decode(tmp_datas)
+            self.data[2].extend(angle)
+            self.data[3].extend(dist)
+            self.data[4].append(len(angle))
             return True
         return False
+    def parse_position(self, line, where):
+        """ 懒加载: 不用正则匹配整行, 只取时间, 点数和位置 """
+        i = line.find(b' [Laser][')
+        j = line.find(b']')
+        if i < 0 or not line.startswith(b'[') or j > i:
+            return False
+        start, end = i + 9, line.rfind(b']')
+        k = line.find(b'|', start, end)
+        self.data[0].append(rbktimetous(line[1:j]))
+        self.data[1].append(float(line[start:k if k > 0 else end]))
+        # 字段为 ts|min_angle|max_angle|step_angle|角度|距离|..., 与 decode 中 min(len(angle), len(dist)) 相同
+        self.data[4].append(max((line.count(b'|', start, end) - 3) // 2, 0))
+        self.data[5].append(self.file_id(os.path.abspath(where[0])))
+        self.data[6].append(where[1])
+        self.data[7].append(len(line))
+        return True
+    def decode(self, tmp_datas):
+        """ 解析一帧的内容, 返回过滤后的 (角度, 距离) """
+        #min_angle = float(tmp_datas[1])
+        #max_angle = float(tmp_datas[2])
+        #step_angle = float(tmp_datas[3])
+        #data_number = int((max_angle - min_angle) / step_angle)
+        angle = np.array(tmp_datas[4::2], dtype = np.float64)
+        dist = np.array(tmp_datas[5::2], dtype = np.float64)
+        n = min(len(angle), len(dist))
+        angle = angle[:n] / 180.0 * math.pi
+        dist = dist[:n]
+        valid = dist < self.max_dist
+        return angle[valid].astype(np.float32), dist[valid].astype(np.float32)
+    def numbers(self):
+        """ 懒加载时每一帧 max_dist 过滤后的点数, 第一次用到时经 scan 读取各帧计算, 之后只计算新增的帧 """
+        if self.counts is None or self.counts[0] is not self.data[4]:
+            self.counts = (self.data[4], Column('q'))
+        counts = self.counts[1]
+        n = len(self.data[0])
+        if len(counts) < n:
+            counts.extend(np.array([len(self.scan(k)[1]) for k in range(len(counts), n)], dtype = np.int64))
+        return counts.array()
+    def file_id(self, file, stamp = None):
+        """ 文件在 data[8] 中的序号, 新的文件同时记录它的标识 """
+        files = self.data[8]
+        if not files or files[-1][0] != file:
+            for i, f in enumerate(files):
+                if f[0] == file:
+                    return i
+            files.append([file, stamp or file_stamp(file)])
+        return len(files) - 1
+    def detach(self, file):
+        """ 跟踪的文件被截断或者轮转, 之前记录的帧不再从文件读取 """
+        for f in self.data[8]:
+            if f[0] == file:
+                f[0] = None
+    def scan(self, k):
+        """ 懒加载时读取第k帧, 返回 (角度, 距离). 最近读取的 LASER_LRU_SIZE 帧保存在内存中 """
+        out = self.recent.get(k)
+        if out is not None:
+            self.recent.move_to_end(k)
+            return out
+        fid = self.data[5][k]
+        file, stamp = self.data[8][fid]
+        out = self.read_scan(file, stamp, self.data[6][k], self.data[7][k])
+        if out is None:
+            if fid not in self.missing:
+                self.missing.add(fid)
+                print("Laser scans in", file or "a rotated file", "can not be read, the file is changed or removed")
+            empty = np.empty(0, dtype = np.float32)
+            out = (empty, empty)
+        self.recent[k] = out
+        if len(self.recent) > LASER_LRU_SIZE:
+            self.recent.popitem(last = False)
+        return out
+    def read_scan(self, file, stamp, offset, length):
+        """ 从文件读取一帧并解析, 文件已被修改, 删除或者该位置不是激光数据时返回 None """
+        if not stamp_valid(file, stamp):
+            return None
+        try:
+            with open(file, 'rb') as f:
+                f.seek(offset)
+                line = f.read(length)
+        except OSError:
+            return None
+        out = self.regex.match(line)
+        if out is None:
+            return None
+        return self.decode(out.group(2).split(b'|'))
+    def read_batch(self, start, stop):
+        """ 懒加载时读取第 start 到 stop-1 帧所有点的 (角度, 距离) """
+        if stop - start == 1:
+            return self.scan(start)
+        scans = [self.scan(k) for k in range(start, stop)]
+        empty = np.empty(0, dtype = np.float32)
+        return np.concatenate([a for a, _ in scans] + [empty]), np.concatenate([d for _, d in scans] + [empty])
+    def merge(self, other):
+        """ 合并另一个解析器的结果, 重新编号文件 """
+        ids = np.array([self.file_id(f, stamp) for f, stamp in other.data[8]], dtype = np.int64)
+        for k in range(8):
+            if k == 5 and len(ids):
+                self.data[5].extend(ids[other.data[5].array()])
+            else:
+                self.data[k].extend(other.data[k])
+    def scans(self, func):
+        if self.lazy:
+            return ScanSequence(len(self.data[0]), self.read_batch, func)
+        offsets = np.zeros(len(self.data[4]) + 1, dtype = np.int64)
+        np.cumsum(self.data[4].array(), out = offsets[1:])
+        angle, dist = self.data[2].array(), self.data[3].array()
+        def batch(start, stop):
+            return angle[offsets[start]:offsets[stop]], dist[offsets[start]:offsets[stop]]
+        return ScanSequence(len(offsets) - 1, batch, func)
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def ts(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].array(), self.data[0].array())
     def angle(self):
-        return self.data[2], self.data[0]
+        return TimeSeries(self.scans(lambda angle, dist: angle), self.data[0].array())
     def dist(self):
-        return self.data[3], self.data[0]
+        return TimeSeries(self.scans(lambda angle, dist: dist), self.data[0].array())
     def x(self):
-        return self.data[4], self.data[0]
+        return TimeSeries(self.scans(lambda angle, dist: polar2xy(angle, dist)[0]), self.data[0].array())
     def y(self):
-        return self.data[5], self.data[0]
+        return TimeSeries(self.scans(lambda angle, dist: polar2xy(angle, dist)[1]), self.data[0].array())
     def number(self):
-        return self.data[6], self.data[0]
+        if self.lazy:
+            return TimeSeries(self.numbers(), self.data[0].array())
+        return TimeSeries(self.data[4].array(), self.data[0].array())
 
 class ErrorLine:
     """  错误信息
     data[0]: t
-    data[1]: 错误信息内容
-    data[2]: Alarm 错误编号
-    data[3]: Alarm 内容
+    data[1]: 错误信息内容, EventText, 只记录行在文件中的位置, content() 用到时再读取
+    data[2]: Alarm 编号目录 AlarmCatalog, 每个编号的内容, 次数, 第一次/最后一次的时间, 对应的事件下标
     """
+    tags = ("error",)
+    binary = True
+    positional = True
     def __init__(self):
-        self.general_regex = re.compile("\[(.*?)\].*\[error\].*")
-        self.regex = re.compile("\[(.*?)\].*\[error\].*\[Alarm\]\[.*?\|(.*?)\|(.*?)\|.*")
-        self.data = [[] for _ in range(4)]
-    def parse(self, line):
+        self.general_regex = re.compile(rb"\[(.*?)\].*\[error\].*")
+        self.regex = re.compile(rb"\[(.*?)\].*\[error\].*\[Alarm\]\[.*?\|(.*?)\|(.*?)\|.*")
+        self.data = [time_column(), EventText(), AlarmCatalog()]
+    def parse(self, line, where = None):
         out = self.regex.match(line)
         if out:
-            self.data[0].append(rbktimetodate(out.group(1)))
-            self.data[1].append(out.group(0))
-            new_num = out.group(2)
-            if not new_num in self.data[2]:
-                self.data[2].append(new_num)
-                self.data[3].append(out.group(3))
+            new_num = decode_text(out.group(2))
+            info = decode_text(out.group(3))
+            t = rbktimetous(out.group(1))
+            self.data[1].add(line, out.end(), where)
+            self.data[2].add(new_num, info, t, len(self.data[0]))
+            self.data[0].append(t)
             return True
         else:
             out = self.general_regex.match(line)
             if out:
-                self.data[0].append(rbktimetodate(out.group(1)))
-                self.data[1].append(out.group(0))
-                new_num = '00000'
-                if not new_num in self.data[2]:
-                    self.data[2].append(new_num)                
-                    self.data[3].append('unKnown Error')
+                t = rbktimetous(out.group(1))
+                self.data[1].add(line, out.end(), where)
+                self.data[2].add('00000', 'unKnown Error', t, len(self.data[0]))
+                self.data[0].append(t)
                 return True
         return False
+    def merge(self, other):
+        merge_alarms(self, other)
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def content(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].texts(), self.data[0].array())
     def alarmnum(self):
-        return self.data[2], self.data[0]
+        return self.data[2].nums(), self.data[0].array()
     def alarminfo(self):
-        return self.data[3], self.data[0]
+        return self.data[2].infos(), self.data[0].array()
+    def alarms(self):
+        return self.data[2]
+    def alarm(self, num):
+        """ 报警编号 num 的所有事件内容 """
+        index = np.frombuffer(self.data[2][num].index, dtype = np.int64)
+        return TimeSeries(self.data[1].take(index), self.data[0].array()[index])
 
 class WarningLine:
     """  报警信息
     data[0]: t
-    data[1]: 报警信息内容
-    data[2]: Alarm 错误编号
-    data[3]: Alarm 内容
+    data[1]: 报警信息内容, EventText, 只记录行在文件中的位置, content() 用到时再读取
+    data[2]: Alarm 编号目录 AlarmCatalog, 每个编号的内容, 次数, 第一次/最后一次的时间, 对应的事件下标
     """
+    tags = ("warning",)
+    binary = True
+    positional = True
     def __init__(self):
-        self.general_regex = re.compile("\[(.*?)\].*\[warning\].*")
-        self.regex = re.compile("\[(.*?)\].*\[warning\].*\[Alarm\]\[.*?\|(.*?)\|(.*?)\|.*")
-        self.data = [[] for _ in range(4)]
-    def parse(self, line):
+        self.general_regex = re.compile(rb"\[(.*?)\].*\[warning\].*")
+        self.regex = re.compile(rb"\[(.*?)\].*\[warning\].*\[Alarm\]\[.*?\|(.*?)\|(.*?)\|.*")
+        self.data = [time_column(), EventText(), AlarmCatalog()]
+    def parse(self, line, where = None):
         out = self.regex.match(line)
         if out:
-            self.data[0].append(rbktimetodate(out.group(1)))
-            self.data[1].append(out.group(0))
-            new_num = out.group(2)
-            if not new_num in self.data[2]:
-                self.data[2].append(new_num)
-                self.data[3].append(out.group(3))
+            new_num = decode_text(out.group(2))
+            info = decode_text(out.group(3))
+            t = rbktimetous(out.group(1))
+            self.data[1].add(line, out.end(), where)
+            self.data[2].add(new_num, info, t, len(self.data[0]))
+            self.data[0].append(t)
             return True
         else:
             out = self.general_regex.match(line)
             if out:
-                self.data[0].append(rbktimetodate(out.group(1)))
-                self.data[1].append(out.group(0))
-                new_num = '00000'
-                if not new_num in self.data[2]:
-                    self.data[2].append(new_num)
-                    self.data[3].append('unKnown Warning')
+                t = rbktimetous(out.group(1))
+                self.data[1].add(line, out.end(), where)
+                self.data[2].add('00000', 'unKnown Warning', t, len(self.data[0]))
+                self.data[0].append(t)
                 return True
         return False
+    def merge(self, other):
+        merge_alarms(self, other)
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def content(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].texts(), self.data[0].array())
     def alarmnum(self):
-        return self.data[2], self.data[0]
+        return self.data[2].nums(), self.data[0].array()
     def alarminfo(self):
-        return self.data[3], self.data[0]
+        return self.data[2].infos(), self.data[0].array()
+    def alarms(self):
+        return self.data[2]
+    def alarm(self, num):
+        """ 报警编号 num 的所有事件内容 """
+        index = np.frombuffer(self.data[2][num].index, dtype = np.int64)
+        return TimeSeries(self.data[1].take(index), self.data[0].array()[index])
 
 class FatalLine:
     """  错误信息
     data[0]: t
-    data[1]: 报警信息内容
-    data[2]: Alarm 错误编号
-    data[3]: Alarm 内容
+    data[1]: 报警信息内容, EventText, 只记录行在文件中的位置, content() 用到时再读取
+    data[2]: Alarm 编号目录 AlarmCatalog, 每个编号的内容, 次数, 第一次/最后一次的时间, 对应的事件下标
     """
+    tags = ("fatal",)
+    binary = True
+    positional = True
     def __init__(self):
-        self.regex = re.compile("\[(.*?)\].*\[fatal\].*\[Alarm\]\[.*?\|(.*?)\|(.*?)\|.*")
-        self.data = [[] for _ in range(4)]
-    def parse(self, line):
+        self.regex = re.compile(rb"\[(.*?)\].*\[fatal\].*\[Alarm\]\[.*?\|(.*?)\|(.*?)\|.*")
+        self.data = [time_column(), EventText(), AlarmCatalog()]
+    def parse(self, line, where = None):
         out = self.regex.match(line)
         if out:
-            self.data[0].append(rbktimetodate(out.group(1)))
-            self.data[1].append(out.group(0))
-            new_num = out.group(2)
-            new_data_flag = True
-            if not new_num in self.data[2]:
-                self.data[2].append(new_num)
-                self.data[3].append(out.group(3))
+            new_num = decode_text(out.group(2))
+            info = decode_text(out.group(3))
+            t = rbktimetous(out.group(1))
+            self.data[1].add(line, out.end(), where)
+            self.data[2].add(new_num, info, t, len(self.data[0]))
+            self.data[0].append(t)
             return True
         return False
+    def merge(self, other):
+        merge_alarms(self, other)
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def content(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].texts(), self.data[0].array())
     def alarmnum(self):
-        return self.data[2], self.data[0]
+        return self.data[2].nums(), self.data[0].array()
     def alarminfo(self):
-        return self.data[3], self.data[0]
+        return self.data[2].infos(), self.data[0].array()
+    def alarms(self):
+        return self.data[2]
+    def alarm(self, num):
+        """ 报警编号 num 的所有事件内容 """
+        index = np.frombuffer(self.data[2][num].index, dtype = np.int64)
+        return TimeSeries(self.data[1].take(index), self.data[0].array()[index])
 
 class NoticeLine:
     """  注意信息
     data[0]: t
-    data[1]: 注意信息内容
-    data[2]: Alarm 错误编号
-    data[3]: Alarm 内容
+    data[1]: 注意信息内容, EventText, 只记录行在文件中的位置, content() 用到时再读取
+    data[2]: Alarm 编号目录 AlarmCatalog, 每个编号的内容, 次数, 第一次/最后一次的时间, 对应的事件下标
     """
+    tags = ("Alarm",)
+    binary = True
+    positional = True
     def __init__(self):
-        self.regex = re.compile("\[(.*?)\].*\[Alarm\]\[Notice\|(.*?)\|(.*?)\|.*")
-        self.data = [[] for _ in range(4)]
-    def parse(self, line):
+        self.regex = re.compile(rb"\[(.*?)\].*\[Alarm\]\[Notice\|(.*?)\|(.*?)\|.*")
+        self.data = [time_column(), EventText(), AlarmCatalog()]
+    def parse(self, line, where = None):
         out = self.regex.match(line)
         if out:
-            self.data[0].append(rbktimetodate(out.group(1)))
-            self.data[1].append(out.group(0))
-            new_num = out.group(2)
-            if not new_num in self.data[2]:
-                self.data[2].append(new_num)
-                self.data[3].append(out.group(3))
+            new_num = decode_text(out.group(2))
+            info = decode_text(out.group(3))
+            t = rbktimetous(out.group(1))
+            self.data[1].add(line, out.end(), where)
+            self.data[2].add(new_num, info, t, len(self.data[0]))
+            self.data[0].append(t)
             return True
         return False
+    def merge(self, other):
+        merge_alarms(self, other)
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def content(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].texts(), self.data[0].array())
     def alarmnum(self):
-        return self.data[2], self.data[0]
+        return self.data[2].nums(), self.data[0].array()
     def alarminfo(self):
-        return self.data[3], self.data[0]
+        return self.data[2].infos(), self.data[0].array()
+    def alarms(self):
+        return self.data[2]
+    def alarm(self, num):
+        """ 报警编号 num 的所有事件内容 """
+        index = np.frombuffer(self.data[2][num].index, dtype = np.int64)
+        return TimeSeries(self.data[1].take(index), self.data[0].array()[index])
+
+TEXT_START, TEXT_FINISH, TEXT_MEMORY = 2, 3, 4 # TextLine 匹配结果的 lastindex, 内存为 TEXT_MEMORY + 通道序号
+
+class TextLine:
+    """ [Text] 行的分类, TaskStart, TaskFinish, Memory 共用
+    一个正则同时匹配任务开始, 任务结束和6种内存信息, 结果按行缓存, 每行只匹配一次.
+    group(1) 为时间, lastindex 为 TEXT_START, TEXT_FINISH 或者 TEXT_MEMORY + 内存通道序号, 此时该组为内存的数值
+    """
+    regex = re.compile(rb"\[(.*?)\].*\[Text\]\[(?:(cnt:)|(Task finished)"
+                       rb"|Used system memory *: *(.*?) *GB\]|Free system memory *: *(.*?) *GB\]"
+                       rb"|Robokit physical memory usage *: *(.*?) *MB\]|Robokit virtual memory usage *: *(.*?) *MB\]"
+                       rb"|Robokit Max physical memory usage *: *(.*?) *MB\]|Robokit Max virtual memory usage *: *(.*?) *MB\])")
+    def __init__(self):
+        self.line = None
+        self.out = None
+    def match(self, line):
+        """ 返回 line 的匹配结果, 同一行(同一个对象)只匹配一次 """
+        if line is not self.line:
+            self.line = line
+            self.out = self.regex.match(line)
+        return self.out
+
+_text_line = TextLine()
+
+def line_end(line):
+    """ 行去掉换行符的长度 """
+    i = line.find(b'\n')
+    return len(line) if i < 0 else i
 
 class TaskStart:
     """  任务开始信息
     data[0]: t
-    data[1]: 开始信息内容
+    data[1]: 开始信息内容, EventText, 只记录行在文件中的位置, content() 用到时再读取
     """
+    tags = ("Text",)
+    binary = True
+    positional = True
     def __init__(self):
-        self.regex = re.compile("\[(.*?)\].*\[Text\]\[cnt:.*")
-        self.data = [[] for _ in range(2)]
-    def parse(self, line):
-        out = self.regex.match(line)
-        if out:
-            self.data[0].append(rbktimetodate(out.group(1)))
-            self.data[1].append(out.group(0))
+        self.data = [time_column(), EventText()]
+    def parse(self, line, where = None):
+        out = _text_line.match(line)
+        if out and out.lastindex == TEXT_START:
+            t = rbktimetous(out.group(1))
+            self.data[1].add(line, line_end(line), where)
+            self.data[0].append(t)
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def content(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].texts(), self.data[0].array())
 
 class TaskFinish:
     """  任务结束信息
     data[0]: t
-    data[1]: 结束信息内容
+    data[1]: 结束信息内容, EventText, 只记录行在文件中的位置, content() 用到时再读取
     """
+    tags = ("Text",)
+    binary = True
+    positional = True
     def __init__(self):
-        self.regex = re.compile("\[(.*?)\].*\[Text\]\[Task finished.*")
-        self.data = [[] for _ in range(2)]
-    def parse(self, line):
-        out = self.regex.match(line)
-        if out:
-            self.data[0].append(rbktimetodate(out.group(1)))
-            self.data[1].append(out.group(0))
+        self.data = [time_column(), EventText()]
+    def parse(self, line, where = None):
+        out = _text_line.match(line)
+        if out and out.lastindex == TEXT_FINISH:
+            t = rbktimetous(out.group(1))
+            self.data[1].add(line, line_end(line), where)
+            self.data[0].append(t)
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def content(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].texts(), self.data[0].array())
 
 class Service:
     """  服务信息
     data[0]: t
-    data[1]: 服务内容
+    data[1]: 服务内容, EventText, 只记录行在文件中的位置, content() 用到时再读取
     """
+    tags = ("Service",)
+    binary = True
+    positional = True
     def __init__(self):
-        self.regex = re.compile("\[(.*?)\].*\[Service\].*")
-        self.data = [[] for _ in range(2)]
-    def parse(self, line):
+        self.regex = re.compile(rb"\[(.*?)\].*\[Service\].*")
+        self.data = [time_column(), EventText()]
+    def parse(self, line, where = None):
         out = self.regex.match(line)
         if out:
-            self.data[0].append(rbktimetodate(out.group(1)))
-            self.data[1].append(out.group(0))
+            t = rbktimetous(out.group(1))
+            self.data[1].add(line, out.end(), where)
+            self.data[0].append(t)
             return True
         return False
     def t(self):
-        return self.data[0]
+        return self.data[0].array()
     def content(self):
-        return self.data[1], self.data[0]
+        return TimeSeries(self.data[1].texts(), self.data[0].array())
 
 class Memory:
     """  内存信息
@@ -990,37 +2572,33 @@ class Memory:
     data[4]: rbk_max_phy
     data[5]: rbk_max_vir
     """
+    tags = ("Text",)
+    binary = True
     def __init__(self):
-        self.regex = [re.compile("\[(.*?)\].*\[Text\]\[Used system memory *: *(.*?) *GB\]"),
-                    re.compile("\[(.*?)\].*\[Text\]\[Free system memory *: *(.*?) *GB\]"),
-                    re.compile("\[(.*?)\].*\[Text\]\[Robokit physical memory usage *: *(.*?) *MB\]"),
-                    re.compile("\[(.*?)\].*\[Text\]\[Robokit virtual memory usage *: *(.*?) *MB\]"),
-                    re.compile("\[(.*?)\].*\[Text\]\[Robokit Max physical memory usage *: *(.*?) *MB\]"),
-                    re.compile("\[(.*?)\].*\[Text\]\[Robokit Max virtual memory usage *: *(.*?) *MB\]")]
-        self.time = [[] for _ in range(6)]
-        self.data = [[] for _ in range(6)]
+        self.time = [time_column() for _ in range(6)]
+        self.data = [Column() for _ in range(6)]
     def parse(self, line):
-        for iter in range(0,6):
-            out = self.regex[iter].match(line)
-            if out:
-                self.time[iter].append(rbktimetodate(out.group(1)))
-                self.data[iter].append(float(out.group(2)))
-                return True
+        out = _text_line.match(line)
+        if out and out.lastindex >= TEXT_MEMORY:
+            k = out.lastindex - TEXT_MEMORY
+            self.time[k].append(rbktimetous(out.group(1)))
+            self.data[k].append(float(out.group(out.lastindex)))
+            return True
         return False
     def t(self):
-        return self.time[0]
+        return self.time[0].array()
     def used_sys(self):
-        return self.data[0], self.time[0]
+        return TimeSeries(self.data[0].array(), self.time[0].array())
     def free_sys(self):
-        return self.data[1], self.time[1]
+        return TimeSeries(self.data[1].array(), self.time[1].array())
     def rbk_phy(self):
-        return self.data[2], self.time[2]
+        return TimeSeries(self.data[2].array(), self.time[2].array())
     def rbk_vir(self):
-        return self.data[3], self.time[3]
+        return TimeSeries(self.data[3].array(), self.time[3].array())
     def rbk_max_phy(self):
-        return self.data[4], self.time[4]
+        return TimeSeries(self.data[4].array(), self.time[4].array())
     def rbk_max_vir(self):
-        return self.data[5], self.time[5]
+        return TimeSeries(self.data[5].array(), self.time[5].array())
 # if __name__ == '__main__':
 #     import matplotlib.pyplot as plt
 #     from matplotlib.widgets import Slider,RadioButtons
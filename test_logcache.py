@@ -0,0 +1,35 @@
+""" logcache 的测试, 用法: python -m pytest test_logcache.py """
+import os
+import shutil
+from loglib import ReadLog, default_parsers
+from logcache import ParseCache, build
+from test_loglib import LOGS, assert_same
+
+def test_cache_round_trip(tmp_path):
+    """ 写入缓存和读取缓存的结果都与直接解析相同 """
+    cache = ParseCache(str(tmp_path / "cache"))
+    fresh = default_parsers()
+    ReadLog(LOGS).parse(*fresh)
+    saved = default_parsers()
+    ReadLog(LOGS).parse_chunked(*saved, workers = 2, cache = cache)
+    assert_same(fresh, saved)
+    for f in LOGS:
+        assert cache.load(f, default_parsers()) is not None
+    loaded = default_parsers()
+    ReadLog(LOGS).parse_chunked(*loaded, workers = 2, cache = cache)
+    assert_same(fresh, loaded)
+
+def test_build_caches_each_file(tmp_path):
+    """ build 逐个文件写入缓存, 每个文件的缓存与单独解析该文件的结果相同 """
+    files = []
+    for f in LOGS:
+        files.append(str(tmp_path / os.path.basename(f)))
+        shutil.copyfile(f, files[-1])
+    cache = ParseCache(str(tmp_path / "cache"))
+    build(files, cache, workers = 1)
+    for f in files:
+        fresh = default_parsers()
+        ReadLog([f]).parse(*fresh)
+        out = cache.load(f, default_parsers())
+        assert out is not None
+        assert_same(fresh, out[0])
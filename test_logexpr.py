@@ -0,0 +1,65 @@
+""" logexpr 的测试, 用法: python -m pytest test_logexpr.py """
+import numpy as np
+import pytest
+from loglib import ReadLog, IMU, MCLoc, Odometer, TimeSeries, time64
+from logexpr import Channels, ExprError, compile_expr
+
+IMU11 = "[2018-12-24 14:55:49.{0:06d}][debug] [IMU][2.8|1545634549959596381|-0.1|0.01|9.5|{1}|0.001|0.1|{2}|-6|-1]\n"
+IMU13 = "[2018-12-24 14:55:49.{0:06d}][debug] [IMU][2.8|0.1|0.2|1545634549959596381|-0.1|0.01|9.5|{1}|0.001|0.1|{2}|-6|-1]\n"
+IMU_BAD = "[2018-12-24 14:55:49.{0:06d}][debug] [IMU][2.8|0.1|{2}]\n"
+
+def test_imu_org_gx_with_mixed_fields(tmp_path):
+    """ 11个和13个字段的IMU混在一起(还有字段数不对的行)时, imu.org_gx 按行等于 gx + offx, 不插值 """
+    fname = str(tmp_path / "imu.log")
+    with open(fname, 'w') as f:
+        for i in range(30):
+            f.write((IMU11, IMU13, IMU_BAD)[i % 3].format(i * 1000, i, 10 * i))
+    imu = IMU()
+    ReadLog([fname]).parse(imu)
+    t = imu.t()
+    gx, offx, pitch = imu.gx(), imu.offx(), imu.pitch()
+    assert len(t) == 30 and len(gx.values) == len(offx.values) == len(pitch.values) == 30
+    assert np.isnan(pitch.values[0::3]).all() and not np.isnan(pitch.values[1::3]).any()
+    data = Channels({"imu.gx": gx, "imu.offx": offx, "imu.org_gx": compile_expr("imu.gx + imu.offx")})
+    org = data["imu.org_gx"]
+    expected = np.arange(30) * 11.0
+    expected[2::3] = np.nan
+    assert np.array_equal(org.times, t)
+    assert np.allclose(org.values, expected, equal_nan = True)
+    # 时间窗口内的结果与整列的结果相同
+    part = data.evaluate("imu.org_gx", time64(t[4]), time64(t[20]))
+    assert np.array_equal(part.times, t[4:21])
+    assert np.allclose(part.values, expected[4:21], equal_nan = True)
+
+MCL = "[2018-12-24 14:55:49.{0:06d}][debug] [Location][{1}|2000|90|0.9|0|0|0|0]\n"
+ODO10 = "[2018-12-24 14:55:49.{0:06d}][debug] [Odometer][1|2|{1}|0|0|false|0|0|0|0]\n"
+ODO14 = "[2018-12-24 14:55:49.{0:06d}][debug] [Odometer][1|2|{1}|0|0|false|0|0|0|0|{1}|1|2|3]\n"
+ODO_BAD = "[2018-12-24 14:55:49.{0:06d}][debug] [Odometer][1|2|3]\n"
+
+def test_channels_with_different_row_counts(tmp_path):
+    """ 行数不同的通道组合时插值到第一个通道的时间上; odo 中没有 encoder 的行和无效的行为 nan """
+    fname = str(tmp_path / "mcl_odo.log")
+    with open(fname, 'w') as f:
+        for i in range(20):
+            if i % 2 == 0:
+                f.write(MCL.format(i * 1000, 1000 * i))
+            f.write((ODO14, ODO10)[i % 2].format(i * 1000, i))
+        f.write(ODO_BAD.format(20000))
+    mcl, odo = MCLoc(), Odometer()
+    ReadLog([fname]).parse(mcl, odo)
+    assert len(mcl.t()) == 10 and len(odo.t()) == 21
+    assert all(len(c) == 21 for c in odo.data)
+    data = Channels({"mcl.x": mcl.x(), "odo.x": odo.x(), "odo.encode0": odo.encode0()})
+    out = data["mcl.x - odo.encode0"]
+    assert np.array_equal(out.times, mcl.t())
+    assert np.allclose(out.values, 0.0)
+    out = data["odo.encode0 - mcl.x"]
+    expected = np.zeros(21)
+    expected[1::2] = np.nan
+    expected[-1] = np.nan
+    assert np.array_equal(out.times, odo.t())
+    assert np.allclose(out.values, expected, equal_nan = True)
+    # 数值和时间长度不同的通道抛出 ExprError, 界面只捕获 ExprError
+    bad = Channels({"mcl.x": mcl.x(), "odo.x": TimeSeries(odo.x().values[:5], odo.t())})
+    with pytest.raises(ExprError):
+        bad.evaluate("mcl.x - odo.x")
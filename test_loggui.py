@@ -0,0 +1,75 @@
+""" loggui 的测试, 不显示窗口, 用法: python -m pytest test_loggui.py """
+import os
+import numpy as np
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+import loggui
+from loglib import ReadLog, Odometer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOGS = [os.path.join(HERE, "test1.log"), os.path.join(HERE, "test2.log")]
+
+def test_ylimits_ignores_nan():
+    assert loggui.ylimits(np.array([np.nan, np.nan]), 1.0) is None
+    assert loggui.ylimits(np.array([np.nan, 1.0, 3.0]), 1.0) == pytest.approx((0.9, 3.1))
+    assert loggui.ylimits(np.array([2.0, 2.0]), 1.0) == pytest.approx((1.95, 2.05))
+
+def test_plot_all_nan_channel(tmp_path, monkeypatch):
+    """ test1.log, test2.log 的IMU为11个字段, imu.pitch 全部为 nan, 绘制时不修改y轴, 不抛出异常 """
+    monkeypatch.setenv('LOGREADER_CACHE_DIR', str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    qapp = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    app = loggui.ApplicationWindow()
+    app.filenames = LOGS
+    app.read_thread.filenames = LOGS
+    app.read_thread.projection = False
+    app.read_thread.run()
+    qapp.processEvents()
+    app.readFinished(LOGS)
+    pitch = app.read_thread.data["imu.pitch"]
+    assert len(pitch[0]) > 0 and np.isnan(pitch[0]).all()
+    ax, combo = app.axs[0], app.combos[0]
+    combo.setCurrentText("imu.pitch")
+    app.drawdata(ax, pitch, "imu.pitch", True)
+    app.new_home()
+    app.new_forward()
+    assert np.isfinite(ax.get_ylim()).all()
+    doubled = app.read_thread.data.evaluate("imu.pitch * 2")
+    assert np.isnan(doubled.values).all()
+    app.drawdata(ax, doubled, "imu.pitch * 2")
+    app.shiftX(*ax.get_xlim())
+    assert np.isfinite(ax.get_ylim()).all()
+    app.close()
+
+def test_follow_update_in_background(tmp_path, monkeypatch):
+    """ 跟踪模式下新追加的内容在后台线程中解析, 合并后与一次读取整个文件的数据相同 """
+    monkeypatch.setenv('LOGREADER_CACHE_DIR', str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    raw = b''.join(open(f, 'rb').read() for f in LOGS)
+    fname = str(tmp_path / "follow.log")
+    with open(fname, 'wb') as f:
+        f.write(raw[:30000])
+    qapp = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    app = loggui.ApplicationWindow()
+    app.filenames = [fname]
+    app.read_thread.filenames = [fname]
+    app.read_thread.follow = True
+    app.read_thread.run()
+    app.readFinished([fname])
+    n = len(app.read_thread.data["odo.vx"][0])
+    for k in range(30000, len(raw), 20000):
+        with open(fname, 'ab') as f:
+            f.write(raw[k:k + 20000])
+        app.followUpdate()
+        # 界面使用的数据在合并前不变
+        assert len(app.read_thread.data["odo.vx"][0]) == n
+        app.read_thread.wait()
+        qapp.processEvents()
+        n = len(app.read_thread.data["odo.vx"][0])
+    odo = Odometer()
+    ReadLog([fname]).parse(odo)
+    assert np.array_equal(app.read_thread.data["odo.vx"][0], odo.vx()[0])
+    assert app.read_thread.follow_parts is None
+    app.close()
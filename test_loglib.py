@@ -0,0 +1,159 @@
+""" loglib 的测试, 用法: python -m pytest test_loglib.py """
+import os
+import random
+import numpy as np
+import pytest
+from loglib import ReadLog, Laser, ErrorLine, WarningLine, FatalLine, NoticeLine, MCLoc, Odometer, IMU
+from loglib import Column, AlarmCatalog, default_parsers, split_file
+from logindex import LogIndex
+from loggen import LogGenerator, parse_rates
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOGS = [os.path.join(HERE, "test1.log"), os.path.join(HERE, "test2.log")]
+
+def snapshot(parsers):
+    """ 解析器的全部数据, 用于比较不同的解析方式: 列为数组, 事件为文本, 报警目录为元组 """
+    out = []
+    for p in parsers:
+        for c in list(getattr(p, 'time', [])) + list(p.data):
+            if isinstance(c, Column):
+                out.append(c.array())
+            elif isinstance(c, AlarmCatalog):
+                out.append([(num, e.info, e.count, e.first, e.last, list(e.index)) for num, e in c.items()])
+            elif isinstance(c, list):
+                out.append([f[0] for f in c])
+        if hasattr(p, 'content'):
+            out.append(list(p.content()[0]))
+        if isinstance(p, Laser):
+            out.append(p.dist()[0].values())
+    return out
+
+def assert_same(a, b):
+    """ 两组解析器的数据相同, nan 视为相同 """
+    sa, sb = snapshot(a), snapshot(b)
+    assert len(sa) == len(sb)
+    for x, y in zip(sa, sb):
+        if isinstance(x, np.ndarray):
+            assert x.shape == y.shape and np.array_equal(x, y, equal_nan = x.dtype.kind == 'f')
+        else:
+            assert x == y
+
+def test_lazy_laser_number_same_as_eager():
+    """ 懒加载的 laser.number 为 max_dist 过滤后的点数, 与不懒加载时相同 """
+    eager, lazy = Laser(1000.0), Laser(1000.0, lazy = True)
+    ReadLog(LOGS).parse(eager)
+    ReadLog(LOGS).parse(lazy)
+    assert len(eager.t()) > 0
+    assert np.array_equal(eager.number()[0], lazy.number()[0])
+    assert np.array_equal(eager.number()[0], [len(d) for d in lazy.dist()[0]])
+    assert np.array_equal(eager.dist()[0].values(), lazy.dist()[0].values())
+    # 解析时只记录过滤前的点数
+    assert (lazy.data[4].array() >= lazy.number()[0]).all()
+
+def test_lazy_laser_scan_of_rewritten_file(tmp_path):
+    """ 文件被重写或删除后, 懒加载的帧读取为空, 不抛出异常 """
+    fname = str(tmp_path / "laser.log")
+    with open(fname, 'wb') as f:
+        for log in LOGS:
+            f.write(open(log, 'rb').read())
+    laser = Laser(1000.0, lazy = True)
+    ReadLog([fname]).parse(laser)
+    n = len(laser.t())
+    assert n > 2 and len(laser.dist()[0][0]) > 0
+    with open(fname, 'wb') as f:
+        f.write(open(LOGS[1], 'rb').read()[:1000])
+    assert len(laser.dist()[0][n - 1]) == 0
+    os.remove(fname)
+    assert len(laser.x()[0][n - 2]) == 0
+
+def test_event_text_of_rotated_file(tmp_path):
+    """ 跟踪的文件被截断重写或删除后, 之前的事件文本为 EVENT_MISSING 加模板, 不读到新文件的内容 """
+    fname = str(tmp_path / "events.log")
+    raw = open(LOGS[0], 'rb').read() + open(LOGS[1], 'rb').read()
+    with open(fname, 'wb') as f:
+        f.write(raw)
+    err = ErrorLine()
+    log = ReadLog([fname])
+    log.follow(err)
+    texts = list(err.content()[0])
+    n = len(texts)
+    assert n > 0 and all(t.startswith('[20') for t in texts)
+    with open(fname, 'wb') as f:
+        f.write(raw[len(raw) // 2:])
+    log.follow(err)
+    assert all(t.startswith('[rotated file is changed or removed]') for t in err.content()[0][:n])
+    assert len(err.content()[0]) > n and all(t.startswith('[20') for t in err.content()[0][n:])
+    os.remove(fname)
+    assert all(' is changed or removed]' in t for t in err.content()[0])
+
+@pytest.fixture(scope = 'module')
+def generated(tmp_path_factory):
+    """ loggen 生成的约2MB的log, 报警较多, 包含格式不对的行 """
+    fname = str(tmp_path_factory.mktemp("gen") / "gen.log")
+    LogGenerator(1, parse_rates(['Alarm=20', 'Bad=2'])).write(fname, 2 * 1024 * 1024)
+    return fname
+
+def test_parallel_same_as_parse(generated):
+    """ 多进程按文件解析的结果与单进程解析相同 """
+    files = LOGS + [generated]
+    serial = default_parsers()
+    ReadLog(files).parse(*serial)
+    parallel = default_parsers()
+    ReadLog(files).parse_parallel(*parallel, workers = 2)
+    assert_same(serial, parallel)
+
+def test_chunked_same_as_parse(generated):
+    """ 用mmap按区间多进程解析的结果与单进程解析相同 """
+    files = LOGS + [generated]
+    assert len(split_file(generated, 64 * 1024)) > 10
+    serial = default_parsers()
+    ReadLog(files).parse(*serial)
+    chunked = default_parsers()
+    ReadLog(files).parse_chunked(*chunked, workers = 2, chunk_size = 64 * 1024)
+    assert_same(serial, chunked)
+
+def test_alarm_catalog_after_merging_chunks(generated):
+    """ 按区间解析后合并的报警编号目录(次数, 内容, 第一次/最后一次的时间, 下标)与单进程解析相同 """
+    assert len(split_file(generated, 16 * 1024)) > 10
+    serial = [ErrorLine(), WarningLine(), FatalLine(), NoticeLine()]
+    ReadLog([generated]).parse(*serial)
+    chunked = [ErrorLine(), WarningLine(), FatalLine(), NoticeLine()]
+    ReadLog([generated]).parse_chunked(*chunked, workers = 2, chunk_size = 16 * 1024)
+    for a, b in zip(serial, chunked):
+        catalog = a.data[2]
+        assert len(catalog) > 0 and sum(catalog.counts().values()) > 10
+        assert catalog.counts() == b.data[2].counts()
+        assert catalog.nums() == b.data[2].nums() and catalog.infos() == b.data[2].infos()
+        for num, e in catalog.items():
+            assert list(e.index) == list(b.data[2][num].index)
+            assert len(e.index) == e.count
+    assert_same(serial, chunked)
+
+@pytest.mark.parametrize('use_index', [False, True])
+def test_time_range_same_as_slicing(generated, use_index):
+    """ 按时间窗口解析的结果与整个文件解析后取窗口内的行相同 """
+    def make():
+        return [MCLoc(), IMU(), Odometer(), ErrorLine(), WarningLine()]
+    full = make()
+    ReadLog([generated]).parse(*full)
+    times = full[1].t()
+    rng = random.Random(use_index)
+    rows = 0
+    for _ in range(30):
+        t1, t2 = sorted(rng.choice(times) for _ in range(2))
+        log = ReadLog([generated])
+        if use_index:
+            log.indexes[generated] = LogIndex(generated, step = 16 * 1024).build()
+        window = make()
+        log.parse(*window, t_start = t1.astype(object), t_end = t2.astype(object))
+        for a, b in zip(full, window):
+            t = a.data[0].array()
+            mask = (t >= t1) & (t <= t2)
+            rows += np.count_nonzero(mask)
+            for c, d in zip(a.data, b.data):
+                if isinstance(c, Column):
+                    x, y = c.array()[mask], d.array()
+                    assert np.array_equal(x, y, equal_nan = x.dtype.kind == 'f')
+            if hasattr(a, 'content'):
+                assert [x for x, m in zip(a.content()[0], mask) if m] == list(b.content()[0])
+    assert rows > 1000